@@ -7,7 +7,13 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN
-from database import init_db
+from database import init_db, close_db
+from leaderboard import leaderboard, init_leaderboard
+from segments import init_segments, stop_segments
+from broadcast import resume_broadcasts, stop_broadcasts
+from outbox import start_outbox, stop_outbox
+from scheduler import start_scheduler, stop_scheduler
+from middlewares import UserMiddleware
 from handlers import all_routers
 
 import os
@@ -46,13 +52,35 @@ async def run_bot():
     await init_db()
     logger.info("✅ База данных инициализирована")
 
+    # Сегменты и рейтинги — за один проход по пользователям
+    await init_segments(on_page=leaderboard.add_rows)
+    logger.info("✅ Сегменты рассылок построены")
+
+    init_leaderboard()
+    logger.info("✅ Рейтинги построены")
+
+    # Пользователь загружается один раз на апдейт
+    dp.update.outer_middleware(UserMiddleware())
+
     for router in all_routers:
         dp.include_router(router)
     logger.info(f"✅ Загружено {len(all_routers)} роутеров")
 
     logger.info("🤖 Бот запускается...")
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    await resume_broadcasts(bot)
+    start_outbox(bot)
+    await start_scheduler()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        # Ожидающие раунды рассчитываются и показываются до остановки
+        await stop_scheduler()
+        await stop_outbox()
+        await stop_broadcasts()
+        await stop_segments()
+        await close_db()
+        logger.info("✅ Соединения с базой закрыты")
 
 
 async def main():
@@ -0,0 +1,244 @@
+# broadcast.py
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+
+from config import (
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_PAGE_SIZE,
+    BROADCAST_PROGRESS_SEC
+)
+from database import (
+    create_broadcast, save_broadcast, get_running_broadcasts,
+    iter_user_id_pages, update_user
+)
+from segments import audience, contains
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять отправку одному пользователю после RetryAfter
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Глобальный лимит скорости: rate токенов в секунду.
+
+    pause() останавливает всех отправителей, когда Telegram
+    отвечает RetryAfter.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + seconds
+        )
+        self._tokens = 0
+
+    async def acquire(self):
+        # Под замком — токены выдаются строго по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Общий лимит для всех исходящих сообщений бота (рассылки и outbox)
+rate_limiter = TokenBucket(BROADCAST_RATE)
+
+# Запущенные рассылки: id -> задача
+_tasks = {}
+
+
+def format_broadcast(text: str) -> str:
+    return f"📢 <b>Объявление</b>\n\n{text}"
+
+
+async def _send(bot: Bot, user_id: int, text: str) -> str:
+    """Отправить одно сообщение: 'sent', 'blocked' или 'failed'"""
+    for _ in range(MAX_RETRIES):
+        await rate_limiter.acquire()
+        try:
+            await bot.send_message(user_id, text, parse_mode="HTML")
+            return "sent"
+        except TelegramRetryAfter as e:
+            logger.warning(f"Рассылка: RetryAfter {e.retry_after} сек")
+            rate_limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramBadRequest:
+            return "failed"
+        except Exception:
+            logger.exception(f"Рассылка: ошибка отправки {user_id}")
+            return "failed"
+    return "failed"
+
+
+async def _sender(bot: Bot, queue: asyncio.Queue, text: str,
+                  stats: dict):
+    while True:
+        user_id = await queue.get()
+        try:
+            result = await _send(bot, user_id, text)
+            stats[result] += 1
+            if result == "blocked":
+                # Больше не пишем ему, пока он сам не вернётся в бота
+                await update_user(user_id, is_reachable=0)
+        except Exception:
+            logger.exception(f"Рассылка: ошибка обработки {user_id}")
+        finally:
+            queue.task_done()
+
+
+def _progress_text(stats: dict, total: int, finished: bool) -> str:
+    done = stats["sent"] + stats["failed"] + stats["blocked"]
+    if finished:
+        return (
+            f"✅ <b>Рассылка завершена!</b>\n\n"
+            f"📨 Отправлено: {stats['sent']}\n"
+            f"🚫 Заблокировали бота: {stats['blocked']}\n"
+            f"❌ Ошибок: {stats['failed']}"
+        )
+    return f"📨 Рассылка... {done}/{total}"
+
+
+async def _show_progress(bot: Bot, job, stats: dict, finished=False):
+    try:
+        await bot.edit_message_text(
+            _progress_text(stats, job["total"], finished),
+            chat_id=job["chat_id"],
+            message_id=job["status_message_id"],
+            parse_mode="HTML"
+        )
+    except Exception:
+        # Сообщение могли удалить или текст не изменился
+        pass
+
+
+async def _run(bot: Bot, job):
+    """Разослать сообщение, начиная после job['last_user_id'].
+
+    Получатели идут страницами; после каждой страницы ждём, пока её
+    разошлют, и сохраняем контрольную точку. После перезапуска
+    повторно может уйти только незавершённая страница.
+    """
+    text = format_broadcast(job["text"])
+    stats = {
+        "sent": job["sent"], "failed": job["failed"],
+        "blocked": job["blocked"],
+    }
+    queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+    senders = [
+        asyncio.create_task(_sender(bot, queue, text, stats))
+        for _ in range(max(1, BROADCAST_WORKERS))
+    ]
+    last_progress = time.monotonic()
+    last_user_id = job["last_user_id"]
+
+    try:
+        async for page in iter_user_id_pages(
+            notifications=True, include_unreachable=False,
+            after_id=job["last_user_id"], page_size=BROADCAST_PAGE_SIZE
+        ):
+            recipients = page
+            if job["segment"]:
+                # Карту берём заново на каждую страницу — в неё уже
+                # попали изменения пользователей с прошлой страницы
+                bitmap = audience(job["segment"])
+                recipients = [u for u in page if contains(bitmap, u)]
+
+            for user_id in recipients:
+                await queue.put(user_id)
+                now = time.monotonic()
+                if now - last_progress >= BROADCAST_PROGRESS_SEC:
+                    last_progress = now
+                    await _show_progress(bot, job, stats)
+
+            await queue.join()
+            last_user_id = page[-1]
+            await save_broadcast(
+                job["id"], last_user_id, stats["sent"], stats["failed"],
+                stats["blocked"]
+            )
+
+        await save_broadcast(
+            job["id"], last_user_id, stats["sent"],
+            stats["failed"], stats["blocked"], finished=True
+        )
+        await _show_progress(bot, job, stats, finished=True)
+        logger.info(
+            f"Рассылка #{job['id']} завершена: отправлено {stats['sent']}, "
+            f"заблокировали {stats['blocked']}, ошибок {stats['failed']}"
+        )
+    except Exception:
+        logger.exception(f"Рассылка #{job['id']} прервана ошибкой")
+    finally:
+        for task in senders:
+            task.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        _tasks.pop(job["id"], None)
+
+
+def _spawn(bot: Bot, job):
+    _tasks[job["id"]] = asyncio.create_task(_run(bot, job))
+
+
+async def start_broadcast(bot: Bot, admin_id: int, chat_id: int,
+                          status_message_id: int, text: str,
+                          total: int, segment: str = "") -> int:
+    """Сохранить задачу рассылки и запустить её в фоне.
+
+    segment — выражение из segments.py; пустое — все, у кого
+    включены уведомления.
+    """
+    broadcast_id = await create_broadcast(
+        admin_id, chat_id, status_message_id, text, total, segment
+    )
+    _spawn(bot, {
+        "id": broadcast_id, "chat_id": chat_id,
+        "status_message_id": status_message_id, "text": text,
+        "total": total, "segment": segment, "last_user_id": 0,
+        "sent": 0, "failed": 0, "blocked": 0,
+    })
+    return broadcast_id
+
+
+async def resume_broadcasts(bot: Bot):
+    """Продолжить рассылки, прерванные перезапуском"""
+    for job in await get_running_broadcasts():
+        logger.info(
+            f"Рассылка #{job['id']} продолжается после {job['last_user_id']}"
+        )
+        _spawn(bot, job)
+
+
+async def stop_broadcasts():
+    """Остановить рассылки; прогресс уже сохранён по страницам"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -8,6 +8,71 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_ID = os.getenv("ADMIN_ID", "8272014510")
 ADMINS = [int(x.strip()) for x in ADMIN_ID.split(",")]
 
+# База данных: число соединений на чтение в пуле
+DB_READERS = int(os.getenv("DB_READERS", 4))
+
+# Групповой коммит: сколько ждать соседние изменения (мс) и
+# максимальный размер одной пачки
+DB_COMMIT_WINDOW_MS = int(os.getenv("DB_COMMIT_WINDOW_MS", 5))
+DB_MAX_BATCH = int(os.getenv("DB_MAX_BATCH", 500))
+
+# Кэш пользователей: максимум записей и время жизни (сек)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+
+# Журнал транзакций пишется пачками: каждые N строк или T мс
+LEDGER_FLUSH_ROWS = int(os.getenv("LEDGER_FLUSH_ROWS", 200))
+LEDGER_FLUSH_MS = int(os.getenv("LEDGER_FLUSH_MS", 1000))
+
+# Архивация транзакций: возраст (дней, 0 — выключено), размер порции,
+# период запуска (часов) и сколько страниц освобождать за порцию
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_CHUNK_ROWS = int(os.getenv("ARCHIVE_CHUNK_ROWS", 5000))
+ARCHIVE_INTERVAL_HOURS = int(os.getenv("ARCHIVE_INTERVAL_HOURS", 24))
+ARCHIVE_VACUUM_PAGES = int(os.getenv("ARCHIVE_VACUUM_PAGES", 2000))
+
+# Рассылка: глобальный лимит сообщений в секунду, число задач-отправителей,
+# размер страницы получателей (контрольная точка) и как часто
+# обновлять сообщение с прогрессом (сек)
+BROADCAST_RATE = int(os.getenv("BROADCAST_RATE", 30))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 8))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", 500))
+BROADCAST_PROGRESS_SEC = int(os.getenv("BROADCAST_PROGRESS_SEC", 5))
+
+# Outbox: параллельных отправок, попыток на сообщение, пауза между
+# сообщениями в один чат (мс) и период проверки повторов (сек)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 4))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_CHAT_INTERVAL_MS = int(os.getenv("OUTBOX_CHAT_INTERVAL_MS", 1000))
+OUTBOX_POLL_SEC = int(os.getenv("OUTBOX_POLL_SEC", 5))
+
+# Сегменты рассылок: как часто пересобирать битовые карты целиком
+# (сдвигаются окна активности и истекают VIP/Premium), минут, и по
+# сколько пользователей читать за страницу (между страницами бот
+# обрабатывает апдейты)
+SEGMENTS_REFRESH_MIN = int(os.getenv("SEGMENTS_REFRESH_MIN", 60))
+SEGMENTS_PAGE_SIZE = int(os.getenv("SEGMENTS_PAGE_SIZE", 1000))
+
+# Кнопки ставок в играх
+GAME_BETS = (10, 50, 100, 250, 500, 1000)
+# Длина серии автоигры (раундов) и игры, где она доступна
+AUTOPLAY_ROUNDS = (10, 50, 100)
+AUTOPLAY_GAMES = ("coin", "number", "dice")
+
+# Через сколько секунд показывать результат игры (длина анимации)
+REVEAL_DELAYS = {
+    "🎲": float(os.getenv("REVEAL_DELAY_DICE", 4)),
+    "🎰": float(os.getenv("REVEAL_DELAY_SLOTS", 4)),
+    "🎯": float(os.getenv("REVEAL_DELAY_DARTS", 4)),
+    "⚽": float(os.getenv("REVEAL_DELAY_FOOTBALL", 4)),
+    "🏀": float(os.getenv("REVEAL_DELAY_BASKETBALL", 4)),
+    "🎳": float(os.getenv("REVEAL_DELAY_BOWLING", 4)),
+    "🪙": float(os.getenv("REVEAL_DELAY_COIN", 2)),
+    "🔢": float(os.getenv("REVEAL_DELAY_NUMBER", 2)),
+}
+# Сколько раундов рассчитывать за один проход планировщика
+REVEAL_MAX_BATCH = int(os.getenv("REVEAL_MAX_BATCH", 200))
+
 # Настройки бота
 BOT_NAME = "🤖 МегаБот"
 BOT_VERSION = "2.0"
@@ -1,17 +1,370 @@
 # database.py
 
+import asyncio
+import logging
 import aiosqlite
 import time
-from config import START_BALANCE
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import NamedTuple
+from levels import level_after_xp, xp_after_xp, previous_level
+from config import (
+    START_BALANCE, DB_READERS, DB_COMMIT_WINDOW_MS, DB_MAX_BATCH,
+    USER_CACHE_SIZE, USER_CACHE_TTL, LEDGER_FLUSH_ROWS, LEDGER_FLUSH_MS,
+    ARCHIVE_AFTER_DAYS, ARCHIVE_CHUNK_ROWS, ARCHIVE_INTERVAL_HOURS,
+    ARCHIVE_VACUUM_PAGES
+)
 
 DB_PATH = "bot_database.db"
+# Архив старых транзакций — отдельный файл, подключается через ATTACH
+ARCHIVE_PATH = "bot_archive.db"
+
+logger = logging.getLogger(__name__)
+
+# Прагмы применяются один раз при открытии соединения
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # ~16 МБ на соединение
+    "PRAGMA mmap_size = 268435456",  # 256 МБ
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Пул: одно соединение на запись и несколько на чтение
+_writer = None
+_readers = None
+
+# Очередь записи: все изменения идут через одну задачу-писателя
+_write_queue = None
+_writer_task = None
+
+# Буфер журнала транзакций: строки копятся в памяти и пишутся пачкой.
+# _pending_ledger — строки текущей пачки записи, в _ledger они
+# попадают только после её коммита.
+_ledger = deque()
+_pending_ledger = []
+_ledger_next_id = 0
+_ledger_wakeup = None
+_ledger_task = None
+_archive_task = None
+
+# Слушатели изменений пользователей (рейтинги и т.п.).
+# Операции складывают в _pending_changes новые значения отслеживаемых
+# колонок, слушатели получают их только после коммита.
+_user_listeners = []
+_pending_changes = []
+
+# Outbox: исходящие сообщения пишутся в таблицу в транзакции изменения,
+# доставляет их фоновый диспетчер (outbox.py)
+_outbox_wakeup = None
+_outbox_enqueued = False
+
+# Счётчики группового коммита
+_write_stats = {
+    "batches": 0,
+    "ops": 0,
+    "failed_ops": 0,
+    "max_batch": 0,
+    "flush_ms_total": 0.0,
+    "flush_ms_max": 0.0,
+}
+
+
+# ==================== POOL ====================
+
+async def _connect(**kwargs):
+    db = await aiosqlite.connect(DB_PATH, **kwargs)
+    db.row_factory = aiosqlite.Row
+    for pragma in PRAGMAS:
+        await db.execute(pragma)
+    await db.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_PATH,))
+    await db.execute("PRAGMA archive.journal_mode = WAL")
+    return db
+
+
+async def open_pool():
+    """Открыть долгоживущие соединения (один раз при старте)"""
+    global _writer, _readers, _write_queue, _writer_task
+    global _ledger_next_id, _ledger_wakeup, _ledger_task, _archive_task
+    global _outbox_wakeup
+    if _writer is not None:
+        return
+
+    # Writer открываем первым — он переводит файл в WAL.
+    # Транзакциями писателя управляем сами (BEGIN/COMMIT).
+    _writer = await _connect(isolation_level=None)
+
+    # Уровни считаются прямо в SQL, без чтения строки пользователя
+    await _writer.create_function(
+        "level_after_xp", 3, level_after_xp, deterministic=True
+    )
+    await _writer.create_function(
+        "xp_after_xp", 3, xp_after_xp, deterministic=True
+    )
+
+    try:
+        await _migrate(_writer)
+        await _create_archive(_writer)
+    except Exception:
+        await _writer.close()
+        _writer = None
+        raise
+
+    _readers = asyncio.Queue()
+    for _ in range(max(1, DB_READERS)):
+        _readers.put_nowait(await _connect())
+
+    # id транзакций раздаём сами, чтобы строки из буфера
+    # сортировались вместе с уже записанными
+    async with _writer.execute(
+        """SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence 
+                      WHERE name = 'transactions'), 0),
+            COALESCE((SELECT MAX(id) FROM transactions), 0)
+        )"""
+    ) as cursor:
+        _ledger_next_id = (await cursor.fetchone())[0] + 1
+
+    _write_queue = asyncio.Queue()
+    _writer_task = asyncio.create_task(_writer_loop())
+    _ledger_wakeup = asyncio.Event()
+    _outbox_wakeup = asyncio.Event()
+    _ledger_task = asyncio.create_task(_ledger_loop())
+    if ARCHIVE_AFTER_DAYS > 0:
+        _archive_task = asyncio.create_task(_archive_loop())
+
+
+async def close_db():
+    """Дождаться записи очереди и закрыть все соединения пула"""
+    global _writer, _readers, _write_queue, _writer_task
+    global _ledger_task, _archive_task
+    if _writer is None:
+        return
+
+    for task in (_archive_task, _ledger_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _ledger_task = None
+    _archive_task = None
+
+    # None — сигнал остановки, встаёт в очередь после всех операций.
+    # Операции из очереди тоже пишут в журнал, поэтому журнал
+    # сбрасываем только после остановки писателя.
+    _write_queue.put_nowait(None)
+    await _writer_task
+
+    if _ledger:
+        # Очередь остановлена — остаток журнала пишем напрямую
+        try:
+            await _writer.execute("BEGIN IMMEDIATE")
+            await _write_ledger(_writer, list(_ledger))
+            await _writer.execute("COMMIT")
+            _ledger.clear()
+        except Exception:
+            if _writer.in_transaction:
+                await _writer.execute("ROLLBACK")
+            logger.exception("Не удалось записать журнал транзакций")
+
+    while not _readers.empty():
+        await _readers.get_nowait().close()
+    await _writer.close()
+    _writer = None
+    _readers = None
+    _write_queue = None
+    _writer_task = None
+
+
+@asynccontextmanager
+async def _read():
+    """Взять соединение для чтения из пула"""
+    db = await _readers.get()
+    try:
+        yield db
+    finally:
+        _readers.put_nowait(db)
+
+
+# ==================== WRITE QUEUE ====================
+
+async def _submit(op, *args, invalidates=(), transaction=True,
+                  notify=()):
+    """Поставить изменение в очередь и дождаться коммита.
+
+    op — корутина вида op(db, *args); её результат возвращается
+    вызывающему после того, как пачка будет закоммичена.
+    invalidates — id пользователей, чьи строки меняет op: они
+    вычищаются из кэша сразу после коммита.
+    transaction=False — op выполняется отдельно, вне транзакции
+    (для обслуживающих команд вроде incremental_vacuum).
+    notify — сообщения (chat_id, text) для outbox: пишутся в той же
+    транзакции, что и op, и только если op завершилась без ошибки.
+    """
+    future = asyncio.get_running_loop().create_future()
+    _write_queue.put_nowait(
+        (op, args, invalidates, transaction, notify, future)
+    )
+    return await future
+
+
+async def _writer_loop():
+    stopping = False
+    while not stopping:
+        item = await _write_queue.get()
+        if item is None:
+            break
+
+        # Окно долговечности: даём соседним изменениям попасть в пачку
+        if DB_COMMIT_WINDOW_MS > 0:
+            await asyncio.sleep(DB_COMMIT_WINDOW_MS / 1000)
+
+        batch = [item]
+        while len(batch) < DB_MAX_BATCH and not _write_queue.empty():
+            item = _write_queue.get_nowait()
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        await _run_batch(batch)
+
+    # Дописываем то, что успели поставить после сигнала остановки
+    while not _write_queue.empty():
+        item = _write_queue.get_nowait()
+        if item is not None:
+            await _run_batch([item])
+
+
+async def _run_batch(batch):
+    """Разбить пачку на транзакции вокруг операций без транзакции"""
+    pending = []
+    for item in batch:
+        op, args, _, transaction, _, future = item
+        if transaction:
+            pending.append(item)
+            continue
+
+        if pending:
+            await _flush(pending)
+            pending = []
+        try:
+            result = await op(_writer, *args)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    if pending:
+        await _flush(pending)
+
+
+async def _flush(batch):
+    """Выполнить пачку изменений в одной транзакции"""
+    global _outbox_enqueued
+    started = time.perf_counter()
+    results = []
+
+    try:
+        await _writer.execute("BEGIN IMMEDIATE")
+        for op, args, _, _, notify, future in batch:
+            # Savepoint изолирует ошибку одной операции от остальных
+            await _writer.execute("SAVEPOINT op")
+            ledger_mark = len(_pending_ledger)
+            changes_mark = len(_pending_changes)
+            try:
+                result = await op(_writer, *args)
+                if notify:
+                    await _write_outbox(_writer, notify)
+            except Exception as e:
+                await _writer.execute("ROLLBACK TO op")
+                await _writer.execute("RELEASE op")
+                del _pending_ledger[ledger_mark:]
+                del _pending_changes[changes_mark:]
+                results.append((future, None, e))
+            else:
+                await _writer.execute("RELEASE op")
+                results.append((future, result, None))
+        await _writer.execute("COMMIT")
+        _ledger.extend(_pending_ledger)
+        changes = list(_pending_changes)
+        if _outbox_enqueued:
+            _outbox_wakeup.set()
+    except Exception as e:
+        if _writer.in_transaction:
+            await _writer.execute("ROLLBACK")
+        results = [(future, None, e) for *_, future in batch]
+        changes = []
+    _pending_ledger.clear()
+    _pending_changes.clear()
+    _outbox_enqueued = False
+
+    if len(_ledger) >= LEDGER_FLUSH_ROWS:
+        _ledger_wakeup.set()
+
+    for _, _, invalidates, _, _, _ in batch:
+        for user_id in invalidates:
+            _user_cache.invalidate(user_id)
+
+    _notify_listeners(changes)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _write_stats["batches"] += 1
+    _write_stats["ops"] += len(batch)
+    _write_stats["max_batch"] = max(_write_stats["max_batch"], len(batch))
+    _write_stats["flush_ms_total"] += elapsed_ms
+    _write_stats["flush_ms_max"] = max(
+        _write_stats["flush_ms_max"], elapsed_ms
+    )
+
+    for future, result, error in results:
+        if future.done():
+            continue
+        if error is not None:
+            _write_stats["failed_ops"] += 1
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def get_write_stats():
+    """Счётчики очереди записи: размер пачек и время коммита"""
+    stats = dict(_write_stats)
+    batches = stats["batches"] or 1
+    stats["avg_batch"] = stats["ops"] / batches
+    stats["avg_flush_ms"] = stats["flush_ms_total"] / batches
+    stats["queued"] = _write_queue.qsize() if _write_queue else 0
+    return stats
 
 
 async def init_db():
     """Инициализация базы данных"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    await open_pool()
+
+
+# ==================== MIGRATIONS ====================
+
+async def _enable_incremental_vacuum(db):
+    # Режим auto_vacuum меняется только полным VACUUM (вне транзакции)
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    await db.execute("VACUUM")
+
+
+# Миграции схемы: (версия, описание, SQL-команды). Применяются по порядку,
+# каждая в своей транзакции. Новые шаги только дописываются в конец.
+# Вместо списка команд может быть корутина — она выполняется
+# вне транзакции (нужно для VACUUM).
+MIGRATIONS = [
+    (1, "Базовые таблицы", [
         # Таблица пользователей
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
                 username TEXT,
@@ -40,10 +393,9 @@ async def init_db():
                 language TEXT DEFAULT 'ru',
                 registered_at INTEGER DEFAULT 0
             )
-        """)
-
+        """,
         # Таблица промокодов
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS promo_codes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 code TEXT UNIQUE,
@@ -55,20 +407,18 @@ async def init_db():
                 created_at INTEGER DEFAULT 0,
                 expires_at INTEGER DEFAULT 0
             )
-        """)
-
+        """,
         # Таблица использования промокодов
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS promo_uses (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
                 promo_code TEXT,
                 used_at INTEGER DEFAULT 0
             )
-        """)
-
+        """,
         # Таблица транзакций
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS transactions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -77,10 +427,9 @@ async def init_db():
                 description TEXT,
                 created_at INTEGER DEFAULT 0
             )
-        """)
-
+        """,
         # Таблица инвентаря
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS inventory (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -88,10 +437,9 @@ async def init_db():
                 item_name TEXT,
                 purchased_at INTEGER DEFAULT 0
             )
-        """)
-
+        """,
         # Таблица тикетов поддержки
-        await db.execute("""
+        """
             CREATE TABLE IF NOT EXISTS support_tickets (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
@@ -101,293 +449,1457 @@ async def init_db():
                 created_at INTEGER DEFAULT 0,
                 replied_at INTEGER DEFAULT 0
             )
-        """)
-
-        await db.commit()
+        """,
+    ]),
+    (2, "Вторичные индексы", [
+        # История транзакций пользователя
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+        ON transactions (user_id, created_at)""",
+        # Проверка повторной активации промокода
+        """CREATE INDEX IF NOT EXISTS idx_promo_uses_user_code
+        ON promo_uses (user_id, promo_code)""",
+        # Инвентарь пользователя
+        """CREATE INDEX IF NOT EXISTS idx_inventory_user_purchased
+        ON inventory (user_id, purchased_at)""",
+        # Открытые тикеты — частичный индекс, закрытые в него не попадают
+        """CREATE INDEX IF NOT EXISTS idx_tickets_open_created
+        ON support_tickets (created_at) WHERE status = 'open'""",
+        # Топы считаются только по незабаненным
+        """CREATE INDEX IF NOT EXISTS idx_users_top_balance
+        ON users (balance) WHERE is_banned = 0""",
+        """CREATE INDEX IF NOT EXISTS idx_users_top_level
+        ON users (level) WHERE is_banned = 0""",
+        """CREATE INDEX IF NOT EXISTS idx_users_top_games_won
+        ON users (games_won) WHERE is_banned = 0""",
+        """CREATE INDEX IF NOT EXISTS idx_users_top_referral_count
+        ON users (referral_count) WHERE is_banned = 0""",
+    ]),
+    (3, "Индекс для архивации транзакций", [
+        """CREATE INDEX IF NOT EXISTS idx_transactions_created
+        ON transactions (created_at)""",
+    ]),
+    (4, "Инкрементальный VACUUM", _enable_incremental_vacuum),
+    (5, "Счётчики для статистики", [
+        """CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID""",
+        # Счётчики правятся триггерами в той же транзакции, что и
+        # изменение строки, поэтому не расходятся с таблицами
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_users_insert
+        AFTER INSERT ON users BEGIN
+            UPDATE counters SET value = value + CASE name
+                WHEN 'users' THEN 1
+                WHEN 'banned_users' THEN NEW.is_banned != 0
+                WHEN 'vip_users' THEN NEW.is_vip != 0
+                WHEN 'premium_users' THEN NEW.is_premium != 0
+            END
+            WHERE name IN ('users', 'banned_users', 'vip_users',
+                           'premium_users');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_users_delete
+        AFTER DELETE ON users BEGIN
+            UPDATE counters SET value = value - CASE name
+                WHEN 'users' THEN 1
+                WHEN 'banned_users' THEN OLD.is_banned != 0
+                WHEN 'vip_users' THEN OLD.is_vip != 0
+                WHEN 'premium_users' THEN OLD.is_premium != 0
+            END
+            WHERE name IN ('users', 'banned_users', 'vip_users',
+                           'premium_users');
+        END""",
+        # UPDATE OF — срабатывает, только если меняются эти колонки
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_users_flags
+        AFTER UPDATE OF is_banned, is_vip, is_premium ON users BEGIN
+            UPDATE counters SET value = value + CASE name
+                WHEN 'banned_users'
+                    THEN (NEW.is_banned != 0) - (OLD.is_banned != 0)
+                WHEN 'vip_users'
+                    THEN (NEW.is_vip != 0) - (OLD.is_vip != 0)
+                WHEN 'premium_users'
+                    THEN (NEW.is_premium != 0) - (OLD.is_premium != 0)
+            END
+            WHERE name IN ('banned_users', 'vip_users', 'premium_users');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_promos_insert
+        AFTER INSERT ON promo_codes BEGIN
+            UPDATE counters SET value = value + (NEW.is_active != 0)
+            WHERE name = 'active_promos';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_promos_delete
+        AFTER DELETE ON promo_codes BEGIN
+            UPDATE counters SET value = value - (OLD.is_active != 0)
+            WHERE name = 'active_promos';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_promos_active
+        AFTER UPDATE OF is_active ON promo_codes BEGIN
+            UPDATE counters
+            SET value = value + (NEW.is_active != 0) - (OLD.is_active != 0)
+            WHERE name = 'active_promos';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_tickets_insert
+        AFTER INSERT ON support_tickets BEGIN
+            UPDATE counters SET value = value + (NEW.status = 'open')
+            WHERE name = 'open_tickets';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_tickets_delete
+        AFTER DELETE ON support_tickets BEGIN
+            UPDATE counters SET value = value - (OLD.status = 'open')
+            WHERE name = 'open_tickets';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_counters_tickets_status
+        AFTER UPDATE OF status ON support_tickets BEGIN
+            UPDATE counters
+            SET value = value + (NEW.status = 'open') - (OLD.status = 'open')
+            WHERE name = 'open_tickets';
+        END""",
+        # Начальные значения — по текущему содержимому таблиц
+        """INSERT OR REPLACE INTO counters (name, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL
+        SELECT 'banned_users', COUNT(*) FROM users WHERE is_banned != 0
+        UNION ALL
+        SELECT 'vip_users', COUNT(*) FROM users WHERE is_vip != 0
+        UNION ALL
+        SELECT 'premium_users', COUNT(*) FROM users WHERE is_premium != 0
+        UNION ALL
+        SELECT 'active_promos', COUNT(*) FROM promo_codes
+        WHERE is_active != 0
+        UNION ALL
+        SELECT 'open_tickets', COUNT(*) FROM support_tickets
+        WHERE status = 'open'""",
+    ]),
+    (6, "Рассылки и недоступные пользователи", [
+        # 0 — пользователь заблокировал бота, рассылки его пропускают
+        "ALTER TABLE users ADD COLUMN is_reachable INTEGER DEFAULT 1",
+        # Состояние рассылки сохраняется после каждой страницы
+        # получателей, чтобы после перезапуска продолжить с неё
+        """CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER,
+            chat_id INTEGER,
+            status_message_id INTEGER,
+            text TEXT,
+            status TEXT DEFAULT 'running',
+            total INTEGER DEFAULT 0,
+            last_user_id INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            created_at INTEGER DEFAULT 0,
+            finished_at INTEGER DEFAULT 0
+        )""",
+    ]),
+    (7, "Outbox исходящих сообщений", [
+        """CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            text TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at INTEGER DEFAULT 0
+        )""",
+        # Диспетчер читает только ожидающие доставки
+        """CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON outbox (next_attempt_at) WHERE status = 'pending'""",
+    ]),
+    (8, "Сегмент аудитории рассылки", [
+        "ALTER TABLE broadcasts ADD COLUMN segment TEXT DEFAULT ''",
+    ]),
+    (9, "Раунды, ожидающие расчёта", [
+        # Ставка уже списана, результат покажем после анимации.
+        # Строка удаляется при расчёте; оставшиеся после падения
+        # рассчитываются при старте
+        """CREATE TABLE IF NOT EXISTS pending_rounds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            game TEXT,
+            bet INTEGER,
+            winnings INTEGER,
+            xp INTEGER,
+            created_at INTEGER DEFAULT 0
+        )""",
+    ]),
+    (10, "Истечение VIP/Premium", [
+        # expire_subscriptions ищет истёкшие подписки по этим индексам
+        """CREATE INDEX IF NOT EXISTS idx_users_vip_until
+        ON users (vip_until) WHERE is_vip != 0""",
+        """CREATE INDEX IF NOT EXISTS idx_users_premium_until
+        ON users (premium_until) WHERE is_premium != 0""",
+        # Снимаем уже истёкшие флаги — триггеры поправят счётчики
+        """UPDATE users SET is_vip = 0 
+        WHERE is_vip != 0 
+        AND vip_until <= CAST(strftime('%s', 'now') AS INTEGER)""",
+        """UPDATE users SET is_premium = 0 
+        WHERE is_premium != 0 
+        AND premium_until <= CAST(strftime('%s', 'now') AS INTEGER)""",
+    ]),
+    (11, "Удаление индексов топов", [
+        # Топы читаются из leaderboard.py, а индексы только
+        # перестраивались на каждой ставке и расчёте
+        "DROP INDEX IF EXISTS idx_users_top_balance",
+        "DROP INDEX IF EXISTS idx_users_top_level",
+        "DROP INDEX IF EXISTS idx_users_top_games_won",
+        "DROP INDEX IF EXISTS idx_users_top_referral_count",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def _migrate(db):
+    """Довести схему до SCHEMA_VERSION"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at INTEGER DEFAULT 0
+        )
+    """)
+    async with db.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version"
+    ) as cursor:
+        current = (await cursor.fetchone())[0]
+
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Схема базы (v{current}) новее, чем поддерживает код "
+            f"(v{SCHEMA_VERSION}). Обновите бота."
+        )
 
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
 
-# ==================== USERS ====================
+        if callable(statements):
+            await statements(db)
+            await db.execute(
+                """INSERT INTO schema_version 
+                (version, description, applied_at) VALUES (?, ?, ?)""",
+                (version, description, int(time.time()))
+            )
+            continue
 
-async def add_user(user_id: int, username: str, first_name: str,
-                   last_name: str, referrer_id: int = 0):
-    async with aiosqlite.connect(DB_PATH) as db:
+        await db.execute("BEGIN IMMEDIATE")
         try:
+            for sql in statements:
+                await db.execute(sql)
             await db.execute(
-                """INSERT INTO users 
-                (user_id, username, first_name, last_name, balance, 
-                 referrer_id, registered_at) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (user_id, username, first_name, last_name,
-                 START_BALANCE, referrer_id, int(time.time()))
+                """INSERT INTO schema_version 
+                (version, description, applied_at) VALUES (?, ?, ?)""",
+                (version, description, int(time.time()))
             )
-            await db.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
-
+            await db.execute("COMMIT")
+        except Exception:
+            await db.execute("ROLLBACK")
+            raise
+
+
+# ==================== LEDGER ====================
+
+def _log_transaction(user_id: int, amount: int, description: str):
+    """Добавить строку журнала (вызывается внутри операции записи)"""
+    global _ledger_next_id
+    _pending_ledger.append({
+        "id": _ledger_next_id,
+        "user_id": user_id,
+        "type": "credit" if amount > 0 else "debit",
+        "amount": amount,
+        "description": description,
+        "created_at": int(time.time()),
+    })
+    _ledger_next_id += 1
+
+
+async def _write_ledger(db, rows):
+    # OR IGNORE: после прерванного сброса строки могут прийти повторно
+    await db.executemany(
+        """INSERT OR IGNORE INTO transactions 
+        (id, user_id, type, amount, description, created_at) 
+        VALUES (:id, :user_id, :type, :amount, :description, 
+                :created_at)""",
+        rows
+    )
+
+
+async def _flush_ledger():
+    """Записать накопленные строки журнала одним executemany"""
+    if not _ledger:
+        return
+
+    # Строки остаются в буфере до коммита, чтобы чтение их не теряло
+    rows = list(_ledger)
+    try:
+        await _submit(_write_ledger, rows)
+    except Exception:
+        logger.exception("Не удалось записать журнал транзакций")
+        return
+
+    for _ in rows:
+        _ledger.popleft()
+
+
+async def _ledger_loop():
+    while True:
+        try:
+            await asyncio.wait_for(
+                _ledger_wakeup.wait(), LEDGER_FLUSH_MS / 1000
+            )
+        except asyncio.TimeoutError:
+            pass
+        _ledger_wakeup.clear()
+        await _flush_ledger()
+
+
+# ==================== ARCHIVE ====================
+
+async def _create_archive(db):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS archive.transactions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            type TEXT,
+            amount INTEGER,
+            description TEXT,
+            created_at INTEGER DEFAULT 0
+        )
+    """)
+    await db.execute(
+        """CREATE INDEX IF NOT EXISTS archive.idx_archive_user_created
+        ON transactions (user_id, created_at)"""
+    )
+
+
+async def _copy_to_archive(db, cutoff, limit):
+    # OR IGNORE: строка могла быть скопирована прошлым прерванным запуском
+    cursor = await db.execute(
+        """INSERT OR IGNORE INTO archive.transactions 
+        SELECT * FROM transactions 
+        WHERE created_at < ? 
+        ORDER BY created_at, id LIMIT ?""",
+        (cutoff, limit)
+    )
+    return cursor.rowcount
+
+
+async def _delete_archived(db, cutoff, limit):
+    # Удаляем только то, что уже лежит в архиве
+    cursor = await db.execute(
+        """DELETE FROM transactions 
+        WHERE id IN (
+            SELECT id FROM transactions 
+            WHERE created_at < ? 
+            ORDER BY created_at, id LIMIT ?
+        ) AND id IN (SELECT id FROM archive.transactions)""",
+        (cutoff, limit)
+    )
+    return cursor.rowcount
+
+
+async def _incremental_vacuum(db, pages):
+    # executescript прогоняет прагму до конца, а не на одну страницу
+    await db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+
+async def archive_transactions(max_age_days: int = ARCHIVE_AFTER_DAYS,
+                               chunk: int = ARCHIVE_CHUNK_ROWS):
+    """Перенести транзакции старше max_age_days в архив.
+
+    Работает порциями по chunk строк, чтобы не держать писателя
+    надолго. Копирование и удаление — разные коммиты: после сбоя
+    строки могут оказаться в обеих таблицах, но не потеряются.
+    """
+    cutoff = int(time.time()) - max_age_days * 86400
+    moved = 0
+
+    while True:
+        await _submit(_copy_to_archive, cutoff, chunk)
+        deleted = await _submit(_delete_archived, cutoff, chunk)
+        moved += deleted
+        if deleted:
+            await _submit(
+                _incremental_vacuum, ARCHIVE_VACUUM_PAGES,
+                transaction=False
+            )
+        if deleted < chunk:
+            break
 
-async def get_user(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE user_id = ?", (user_id,)
-        ) as cursor:
-            return await cursor.fetchone()
+    return moved
 
 
-async def update_user(user_id: int, **kwargs):
-    async with aiosqlite.connect(DB_PATH) as db:
-        for key, value in kwargs.items():
-            await db.execute(
-                f"UPDATE users SET {key} = ? WHERE user_id = ?",
-                (value, user_id)
-            )
-        await db.commit()
+async def _archive_loop():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+        try:
+            moved = await archive_transactions()
+        except Exception:
+            logger.exception("Ошибка архивации транзакций")
+        else:
+            logger.info(f"Архивировано транзакций: {moved}")
 
 
-async def update_balance(user_id: int, amount: int, 
-                         description: str = ""):
-    async with aiosqlite.connect(DB_PATH) as db:
-        if amount > 0:
-            await db.execute(
-                """UPDATE users 
-                SET balance = balance + ?, total_earned = total_earned + ? 
-                WHERE user_id = ?""",
-                (amount, amount, user_id)
-            )
-        else:
-            await db.execute(
-                """UPDATE users 
-                SET balance = balance + ?, total_spent = total_spent + ? 
-                WHERE user_id = ?""",
-                (amount, abs(amount), user_id)
-            )
+# ==================== COUNTERS ====================
 
-        # Логируем транзакцию
-        await db.execute(
-            """INSERT INTO transactions 
-            (user_id, type, amount, description, created_at) 
-            VALUES (?, ?, ?, ?, ?)""",
-            (user_id, "credit" if amount > 0 else "debit",
-             amount, description, int(time.time()))
-        )
-        await db.commit()
+async def get_counters():
+    """Агрегаты для статистики из таблицы counters.
+
+    Ключи: users, banned_users, vip_users, premium_users,
+    active_promos, open_tickets. Значения поддерживают триггеры.
+    """
+    async with _read() as db:
+        async with db.execute("SELECT name, value FROM counters") as cursor:
+            return {row["name"]: row["value"] async for row in cursor}
 
 
-async def add_xp(user_id: int, xp: int):
-    """Добавить опыт и проверить повышение уровня"""
-    user = await get_user(user_id)
-    if not user:
-        return False, 0
+# ==================== USER CACHE ====================
 
-    new_xp = user["xp"] + xp
-    current_level = user["level"]
-    new_level = current_level
+class _UserCache:
+    """LRU-кэш строк users с ограничением по времени жизни"""
 
-    # Формула уровня: level * 100 XP для следующего уровня
-    while new_xp >= new_level * 100:
-        new_xp -= new_level * 100
-        new_level += 1
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rows = OrderedDict()
+        # Чтения в процессе: user_id -> число незавершённых get_user.
+        # Если строку инвалидировали во время чтения, результат
+        # этого чтения в кэш не кладём — он мог устареть.
+        self._loading = {}
+        self._dirty = set()
 
-    await update_user(user_id, xp=new_xp, level=new_level)
+    def get(self, user_id: int):
+        entry = self._rows.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        row, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._rows[user_id]
+            self.misses += 1
+            return None
+
+        self._rows.move_to_end(user_id)
+        self.hits += 1
+        return row
+
+    def begin_load(self, user_id: int):
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+
+    def end_load(self, user_id: int, row):
+        if row is not None and user_id not in self._dirty:
+            self._rows[user_id] = (row, time.monotonic() + self.ttl)
+            self._rows.move_to_end(user_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+
+        self._loading[user_id] -= 1
+        if not self._loading[user_id]:
+            del self._loading[user_id]
+            self._dirty.discard(user_id)
+
+    def invalidate(self, user_id: int):
+        self._rows.pop(user_id, None)
+        if user_id in self._loading:
+            self._dirty.add(user_id)
+
+    def stats(self):
+        return {
+            "size": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_user_cache = _UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def get_cache_stats():
+    """Счётчики кэша пользователей: попадания, промахи, вытеснения"""
+    return _user_cache.stats()
+
+
+# ==================== CHANGE LISTENERS ====================
+
+# Колонки users, новые значения которых получают слушатели
+# (рейтинги и сегменты рассылок)
+TRACKED_COLUMNS = (
+    "balance", "level", "games_won", "referral_count", "is_banned",
+    "is_reachable", "notifications", "language", "games_played",
+    "last_game", "last_daily", "is_vip", "vip_until", "is_premium",
+    "premium_until",
+)
+_TRACKED_RETURNING = "RETURNING user_id, " + ", ".join(TRACKED_COLUMNS)
+
+
+def add_user_listener(callback):
+    """Подписаться на изменения пользователей.
+
+    callback(row) вызывается после коммита для каждой изменённой
+    строки; в row есть user_id и все колонки из TRACKED_COLUMNS.
+    """
+    _user_listeners.append(callback)
+
+
+def _track(row):
+    """Запомнить новые значения строки до коммита пачки"""
+    if row is not None and _user_listeners:
+        _pending_changes.append(row)
+
+
+def _notify_listeners(changes):
+    for row in changes:
+        for callback in _user_listeners:
+            try:
+                callback(row)
+            except Exception:
+                logger.exception("Ошибка слушателя изменений users")
+
+
+async def iter_tracked_user_pages(page_size: int = 1000):
+    """Отслеживаемые колонки всех пользователей страницами по user_id.
+
+    Как iter_user_id_pages: соединение берётся на одну страницу,
+    между страницами цикл событий свободен.
+    """
+    sql = (
+        f"SELECT user_id, {', '.join(TRACKED_COLUMNS)} FROM users "
+        f"WHERE user_id > ? ORDER BY user_id LIMIT ?"
+    )
+    last_id = 0
+    while True:
+        async with _read() as db:
+            async with db.execute(sql, (last_id, page_size)) as cursor:
+                rows = await cursor.fetchall()
+
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["user_id"]
 
-    leveled_up = new_level > current_level
-    return leveled_up, new_level
 
+# ==================== USERS ====================
 
-async def get_top_users(limit: int = 10, order_by: str = "balance"):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def _add_user(db, user_id, username, first_name, last_name,
+                    referrer_id):
+    try:
         async with db.execute(
-            f"""SELECT * FROM users 
-            WHERE is_banned = 0 
-            ORDER BY {order_by} DESC LIMIT ?""",
-            (limit,)
+            f"""INSERT INTO users 
+            (user_id, username, first_name, last_name, balance, 
+             referrer_id, registered_at) 
+            VALUES (?, ?, ?, ?, ?, ?, ?) 
+            {_TRACKED_RETURNING}""",
+            (user_id, username, first_name, last_name,
+             START_BALANCE, referrer_id, int(time.time()))
         ) as cursor:
-            return await cursor.fetchall()
+            _track(await cursor.fetchone())
+        return True
+    except aiosqlite.IntegrityError:
+        return False
 
 
-async def get_all_users_count():
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("SELECT COUNT(*) FROM users") as cursor:
-            result = await cursor.fetchone()
-            return result[0]
+async def add_user(user_id: int, username: str, first_name: str,
+                   last_name: str, referrer_id: int = 0):
+    return await _submit(
+        _add_user, user_id, username, first_name, last_name, referrer_id,
+        invalidates=(user_id,)
+    )
 
 
-async def get_all_user_ids():
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            "SELECT user_id FROM users WHERE is_banned = 0"
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+async def get_user(user_id: int):
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    _user_cache.begin_load(user_id)
+    try:
+        async with _read() as db:
+            async with db.execute(
+                "SELECT * FROM users WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                user = await cursor.fetchone()
+    finally:
+        _user_cache.end_load(user_id, user)
+    return user
+
+
+# Колонки users, которые можно менять через update_user/increment_user
+USER_COLUMNS = frozenset({
+    "username", "first_name", "last_name", "balance", "xp", "level",
+    "referrer_id", "referral_count", "games_played", "games_won",
+    "total_earned", "total_spent", "is_vip", "is_premium", "is_banned",
+    "has_color_nick", "has_double_daily", "double_daily_until",
+    "vip_until", "premium_until", "last_daily", "last_game",
+    "notifications", "language", "registered_at", "is_reachable",
+})
+
+
+def _check_columns(columns):
+    unknown = set(columns) - USER_COLUMNS
+    if unknown:
+        raise ValueError(
+            f"Неизвестные колонки users: {', '.join(sorted(unknown))}"
+        )
 
 
-# ==================== PROMO CODES ====================
+@lru_cache(maxsize=128)
+def _update_sql(columns: tuple):
+    """Текст UPDATE для набора колонок (кэшируется)"""
+    assignments = ", ".join(f"{col} = ?" for col in columns)
+    sql = f"UPDATE users SET {assignments} WHERE user_id = ?"
+    if set(columns) & set(TRACKED_COLUMNS):
+        sql += f" {_TRACKED_RETURNING}"
+    return sql
 
-async def create_promo(code: str, reward: int, max_uses: int,
-                       created_by: int, expires_hours: int = 0):
-    async with aiosqlite.connect(DB_PATH) as db:
-        expires_at = 0
-        if expires_hours > 0:
-            expires_at = int(time.time()) + (expires_hours * 3600)
 
-        try:
-            await db.execute(
-                """INSERT INTO promo_codes 
-                (code, reward, max_uses, created_by, created_at, expires_at) 
-                VALUES (?, ?, ?, ?, ?, ?)""",
-                (code.upper(), reward, max_uses, created_by,
-                 int(time.time()), expires_at)
-            )
-            await db.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+@lru_cache(maxsize=128)
+def _increment_sql(columns: tuple):
+    """Текст атомарного инкремента для набора колонок (кэшируется)"""
+    assignments = ", ".join(f"{col} = {col} + ?" for col in columns)
+    extra = [col for col in columns if col not in TRACKED_COLUMNS]
+    returning = ", ".join([_TRACKED_RETURNING, *extra])
+    return f"UPDATE users SET {assignments} WHERE user_id = ? {returning}"
 
 
-async def use_promo(user_id: int, code: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def _update_user(db, user_id, kwargs):
+    async with db.execute(
+        _update_sql(tuple(kwargs)), (*kwargs.values(), user_id)
+    ) as cursor:
+        _track(await cursor.fetchone())
+
+
+async def update_user(user_id: int, **kwargs):
+    """Обновить несколько колонок одним UPDATE"""
+    if not kwargs:
+        return
+    _check_columns(kwargs)
+    await _submit(_update_user, user_id, kwargs, invalidates=(user_id,))
+
+
+async def _increment_user(db, user_id, deltas):
+    async with db.execute(
+        _increment_sql(tuple(deltas)), (*deltas.values(), user_id)
+    ) as cursor:
+        user = await cursor.fetchone()
+    _track(user)
+    return user
+
+
+async def increment_user(user_id: int, **deltas):
+    """Атомарно прибавить значения к счётчикам пользователя.
+
+    Возвращает строку с новыми значениями изменённых колонок
+    или None, если пользователя нет.
+    """
+    if not deltas:
+        return None
+    _check_columns(deltas)
+    return await _submit(
+        _increment_user, user_id, deltas, invalidates=(user_id,)
+    )
+
+
+async def _apply_balance(db, user_id: int, amount: int,
+                         description: str):
+    """Изменить баланс и записать транзакцию в открытой транзакции"""
+    if amount > 0:
+        sql = f"""UPDATE users 
+            SET balance = balance + ?, total_earned = total_earned + ? 
+            WHERE user_id = ? {_TRACKED_RETURNING}"""
+    else:
+        sql = f"""UPDATE users 
+            SET balance = balance + ?, total_spent = total_spent + ? 
+            WHERE user_id = ? {_TRACKED_RETURNING}"""
+    async with db.execute(sql, (amount, abs(amount), user_id)) as cursor:
+        _track(await cursor.fetchone())
+
+    # Логируем транзакцию (None — запись в журнал делает вызывающий)
+    if description is not None:
+        _log_transaction(user_id, amount, description)
 
-        # Проверяем существование промокода
+
+async def update_balance(user_id: int, amount: int, 
+                         description: str = "", notify=()):
+    await _submit(
+        _apply_balance, user_id, amount, description,
+        invalidates=(user_id,), notify=notify
+    )
+
+
+async def _try_debit(db, user_id: int, amount: int, reason: str):
+    """Списать amount, только если его хватает; новый баланс или None"""
+    if amount <= 0:
+        # Отрицательное «списание» было бы начислением
+        raise ValueError(f"Сумма списания не положительная: {amount}")
+    async with db.execute(
+        f"""UPDATE users 
+        SET balance = balance - ?, total_spent = total_spent + ? 
+        WHERE user_id = ? AND balance >= ? 
+        {_TRACKED_RETURNING}""",
+        (amount, amount, user_id, amount)
+    ) as cursor:
+        user = await cursor.fetchone()
+    if user is None:
+        return None
+
+    _track(user)
+    if reason is not None:
+        _log_transaction(user_id, -amount, reason)
+    return user["balance"]
+
+
+async def _try_debit_op(db, user_id, amount, reason):
+    balance = await _try_debit(db, user_id, amount, reason)
+    if balance is not None:
+        return True, balance
+
+    async with db.execute(
+        "SELECT balance FROM users WHERE user_id = ?", (user_id,)
+    ) as cursor:
+        user = await cursor.fetchone()
+    return False, user["balance"] if user else 0
+
+
+async def try_debit(user_id: int, amount: int, reason: str):
+    """Атомарно списать amount, если хватает средств.
+
+    Проверка и списание — один UPDATE ... WHERE balance >= amount,
+    транзакция пишется в журнал там же. Возвращает (успех, баланс):
+    при неудаче баланс не меняется и возвращается текущий.
+    amount <= 0 — ValueError.
+    """
+    return await _submit(
+        _try_debit_op, user_id, amount, reason, invalidates=(user_id,)
+    )
+
+
+async def _add_xp(db, user_id, xp):
+    # Обе колонки в SET вычисляются по старым значениям строки
+    async with db.execute(
+        f"""UPDATE users 
+        SET level = level_after_xp(xp, level, ?), 
+            xp = xp_after_xp(xp, level, ?) 
+        WHERE user_id = ? 
+        {_TRACKED_RETURNING}, xp""",
+        (xp, xp, user_id)
+    ) as cursor:
+        user = await cursor.fetchone()
+
+    if not user:
+        return False, 0
+    _track(user)
+
+    new_level = user["level"]
+    leveled_up = new_level > previous_level(user["xp"], new_level, xp)
+    return leveled_up, new_level
+
+
+async def add_xp(user_id: int, xp: int):
+    """Добавить опыт и проверить повышение уровня"""
+    return await _submit(_add_xp, user_id, xp, invalidates=(user_id,))
+
+
+async def _expire_subscriptions(db, now):
+    expired = []
+    for flag, until in (("is_vip", "vip_until"),
+                        ("is_premium", "premium_until")):
         async with db.execute(
-            "SELECT * FROM promo_codes WHERE code = ? AND is_active = 1",
-            (code.upper(),)
+            f"""UPDATE users SET {flag} = 0 
+            WHERE {flag} != 0 AND {until} <= ? 
+            {_TRACKED_RETURNING}""",
+            (now,)
         ) as cursor:
-            promo = await cursor.fetchone()
+            async for user in cursor:
+                _track(user)
+                expired.append(user["user_id"])
+    return expired
+
+
+async def expire_subscriptions():
+    """Снять флаги VIP/Premium, у которых истёк срок.
+
+    Счётчики vip_users/premium_users считают флаги, поэтому без этого
+    в них остаются бывшие подписчики. Возвращает число снятых флагов.
+    """
+    expired = await _submit(_expire_subscriptions, int(time.time()))
+    # Кого затронет, заранее не известно — чистим кэш после коммита
+    for user_id in expired:
+        _user_cache.invalidate(user_id)
+    return len(expired)
+
+
+async def get_users(user_ids):
+    """Строки нескольких пользователей в порядке user_ids.
+
+    Берёт что есть из кэша, остальных дочитывает одним запросом.
+    """
+    found = {}
+    missing = []
+    for user_id in user_ids:
+        user = _user_cache.get(user_id)
+        if user is not None:
+            found[user_id] = user
+        else:
+            missing.append(user_id)
 
-        if not promo:
-            return None, "❌ Промокод не найден или неактивен"
+    if missing:
+        placeholders = ", ".join("?" * len(missing))
+        for user_id in missing:
+            _user_cache.begin_load(user_id)
+        rows = []
+        try:
+            async with _read() as db:
+                async with db.execute(
+                    f"SELECT * FROM users WHERE user_id IN ({placeholders})",
+                    missing
+                ) as cursor:
+                    rows = await cursor.fetchall()
+        finally:
+            loaded = {row["user_id"]: row for row in rows}
+            for user_id in missing:
+                _user_cache.end_load(user_id, loaded.get(user_id))
+        found.update(loaded)
 
-        # Проверяем срок действия
-        if promo["expires_at"] > 0 and \
-                int(time.time()) > promo["expires_at"]:
-            return None, "⏰ Срок действия промокода истёк"
+    return [found[user_id] for user_id in user_ids if user_id in found]
 
-        # Проверяем лимит использований
-        if promo["current_uses"] >= promo["max_uses"]:
-            return None, "📛 Промокод уже использован максимальное число раз"
 
-        # Проверяем, не использовал ли пользователь
+async def get_all_users_count():
+    return (await get_counters())["users"]
+
+
+@lru_cache(maxsize=32)
+def _user_ids_sql(include_banned: bool, include_unreachable: bool,
+                  notifications, active: bool):
+    """Текст запроса страницы user_id для набора фильтров (кэшируется)"""
+    conditions = ["user_id > ?"]
+    if not include_banned:
+        conditions.append("is_banned = 0")
+    if not include_unreachable:
+        conditions.append("is_reachable = 1")
+    if notifications is not None:
+        conditions.append(f"notifications = {int(bool(notifications))}")
+    if active:
+        conditions.append("MAX(last_game, last_daily) >= ?")
+    return (
+        f"SELECT user_id FROM users WHERE {' AND '.join(conditions)} "
+        f"ORDER BY user_id LIMIT ?"
+    )
+
+
+async def iter_user_id_pages(notifications=None,
+                             include_banned: bool = False,
+                             include_unreachable: bool = True,
+                             active_since: int = 0, after_id: int = 0,
+                             page_size: int = 1000):
+    """Асинхронно перебрать user_id по возрастанию, страницами.
+
+    Страницы читаются по первичному ключу (user_id > последний),
+    соединение из пула берётся только на время одной страницы —
+    память постоянна, а пул не блокируется на всю рассылку.
+    notifications — True/False, чтобы отобрать по настройке;
+    include_unreachable=False — пропустить заблокировавших бота;
+    active_since — только игравшие или бравшие бонус с этого времени;
+    after_id — продолжить после этого id (для возобновления задач).
+    """
+    sql = _user_ids_sql(
+        include_banned, include_unreachable, notifications,
+        active_since > 0
+    )
+    last_id = after_id
+    while True:
+        params = [last_id]
+        if active_since > 0:
+            params.append(active_since)
+        params.append(page_size)
+
+        async with _read() as db:
+            async with db.execute(sql, params) as cursor:
+                rows = await cursor.fetchall()
+
+        if rows:
+            yield [row[0] for row in rows]
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+
+# ==================== GAMES ====================
+
+class Settlement(NamedTuple):
+    """Итог расчёта игры"""
+    balance: int
+    xp: int
+    level: int
+    leveled_up: bool
+    winnings: int
+
+
+async def _place_bet(db, user_id, game, bet, winnings, xp):
+    if await _try_debit(db, user_id, bet, f"Ставка: {game}") is None:
+        return None
+    async with db.execute(
+        """INSERT INTO pending_rounds 
+        (user_id, game, bet, winnings, xp, created_at) 
+        VALUES (?, ?, ?, ?, ?, ?)""",
+        (user_id, game, bet, winnings, xp, int(time.time()))
+    ) as cursor:
+        return cursor.lastrowid
+
+
+async def place_bet(user_id: int, game: str, bet: int,
+                    winnings: int = None, xp: int = None):
+    """Списать ставку и отложить расчёт раунда.
+
+    Если исход уже известен, он сохраняется в pending_rounds, иначе
+    (анимация ещё не отправлена) там NULL. Возвращает id раунда для
+    settle_game(round_id=...) или None, если не хватает средств.
+    """
+    return await _submit(
+        _place_bet, user_id, game, bet, winnings, xp,
+        invalidates=(user_id,)
+    )
+
+
+async def _set_round_outcome(db, round_id, winnings, xp):
+    await db.execute(
+        "UPDATE pending_rounds SET winnings = ?, xp = ? WHERE id = ?",
+        (winnings, xp, round_id)
+    )
+
+
+async def set_round_outcome(round_id: int, winnings: int, xp: int):
+    """Сохранить исход раунда, поставленного без него.
+
+    После этого раунд, оставшийся после падения, рассчитывается,
+    а не возвращается: игрок уже видел результат анимации.
+    """
+    await _submit(_set_round_outcome, round_id, winnings, xp)
+
+
+async def _refund_round(db, round_id):
+    async with db.execute(
+        "DELETE FROM pending_rounds WHERE id = ? RETURNING user_id, game, bet",
+        (round_id,)
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return False
+    await _apply_balance(
+        db, row["user_id"], row["bet"], f"Возврат ставки: {row['game']}"
+    )
+    return True
+
+
+async def refund_round(round_id: int, user_id: int, notify=()):
+    """Вернуть ставку нерассчитанного раунда"""
+    return await _submit(
+        _refund_round, round_id, invalidates=(user_id,), notify=notify
+    )
+
+
+async def _settle_game(db, user_id, game, bet, winnings, xp, round_id):
+    if round_id is None:
+        if await _try_debit(db, user_id, bet, f"Ставка: {game}") is None:
+            return None
+    else:
+        # Ставка списана в place_bet; раунд рассчитывается один раз
+        async with db.execute(
+            "DELETE FROM pending_rounds WHERE id = ? RETURNING id",
+            (round_id,)
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                return None
+
+    if winnings > 0:
+        await _apply_balance(db, user_id, winnings, f"Выигрыш: {game}")
+
+    return await _record_games(
+        db, user_id, 1, 1 if winnings > 0 else 0, winnings, xp
+    )
+
+
+async def _record_games(db, user_id, played, won, winnings, xp):
+    """Статистика игр и опыт после расчёта; возвращает Settlement"""
+    async with db.execute(
+        f"""UPDATE users 
+        SET games_played = games_played + ?, 
+            games_won = games_won + ?, last_game = ?, 
+            level = level_after_xp(xp, level, ?), 
+            xp = xp_after_xp(xp, level, ?) 
+        WHERE user_id = ? 
+        {_TRACKED_RETURNING}, xp""",
+        (played, won, int(time.time()), xp, xp, user_id)
+    ) as cursor:
+        user = await cursor.fetchone()
+    _track(user)
+
+    return Settlement(
+        balance=user["balance"],
+        xp=user["xp"],
+        level=user["level"],
+        leveled_up=user["level"] > previous_level(
+            user["xp"], user["level"], xp
+        ),
+        winnings=winnings,
+    )
+
+
+async def settle_game(user_id: int, game: str, bet: int,
+                      winnings: int, xp: int, round_id: int = None,
+                      notify=()):
+    """Рассчитать раунд одной транзакцией.
+
+    Списывает ставку, начисляет выигрыш, обновляет статистику игр
+    и опыт. Возвращает Settlement или None, если не хватает средств.
+    С round_id ставка уже списана в place_bet — раунд только
+    закрывается (None, если он уже рассчитан).
+    """
+    return await _submit(
+        _settle_game, user_id, game, bet, winnings, xp, round_id,
+        invalidates=(user_id,), notify=notify
+    )
+
+
+async def _settle_autoplay(db, user_id, game, bet, rounds, wins,
+                           winnings, xp):
+    stake = bet * rounds
+    # Вся серия — одно списание, одно начисление и одна строка журнала
+    if await _try_debit(db, user_id, stake, None) is None:
+        return None
+    if winnings > 0:
+        await _apply_balance(db, user_id, winnings, None)
+    _log_transaction(
+        user_id, winnings - stake, f"Автоигра: {game} ×{rounds}"
+    )
+    return await _record_games(db, user_id, rounds, wins, winnings, xp)
+
+
+async def settle_autoplay(user_id: int, game: str, bet: int,
+                          rounds: int, wins: int, winnings: int,
+                          xp: int):
+    """Рассчитать серию из rounds раундов одной транзакцией.
+
+    Ставка за всю серию (bet * rounds) списывается сразу, в журнал
+    пишется одна строка с итогом серии. Возвращает Settlement
+    (winnings — сумма выигрышей) или None, если не хватает средств.
+    """
+    return await _submit(
+        _settle_autoplay, user_id, game, bet, rounds, wins, winnings, xp,
+        invalidates=(user_id,)
+    )
+
+
+async def get_pending_rounds():
+    async with _read() as db:
         async with db.execute(
-            "SELECT * FROM promo_uses WHERE user_id = ? AND promo_code = ?",
-            (user_id, code.upper())
+            "SELECT * FROM pending_rounds ORDER BY id"
         ) as cursor:
-            used = await cursor.fetchone()
+            return await cursor.fetchall()
 
-        if used:
-            return None, "🚫 Вы уже использовали этот промокод"
 
-        # Активируем промокод
-        reward = promo["reward"]
+# ==================== PROMO CODES ====================
 
+async def _create_promo(db, code, reward, max_uses, created_by,
+                        expires_at):
+    try:
         await db.execute(
-            "UPDATE promo_codes SET current_uses = current_uses + 1 WHERE code = ?",
-            (code.upper(),)
+            """INSERT INTO promo_codes 
+            (code, reward, max_uses, created_by, created_at, expires_at) 
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            (code.upper(), reward, max_uses, created_by,
+             int(time.time()), expires_at)
         )
-        await db.execute(
-            "INSERT INTO promo_uses (user_id, promo_code, used_at) VALUES (?, ?, ?)",
-            (user_id, code.upper(), int(time.time()))
-        )
-        await db.commit()
+        return True
+    except aiosqlite.IntegrityError:
+        return False
 
-    # Начисляем награду
-    await update_balance(user_id, reward, f"Промокод: {code.upper()}")
+
+async def create_promo(code: str, reward: int, max_uses: int,
+                       created_by: int, expires_hours: int = 0):
+    expires_at = 0
+    if expires_hours > 0:
+        expires_at = int(time.time()) + (expires_hours * 3600)
+
+    return await _submit(
+        _create_promo, code, reward, max_uses, created_by, expires_at
+    )
+
+
+async def _use_promo(db, user_id, code):
+    # Проверяем существование промокода
+    async with db.execute(
+        "SELECT * FROM promo_codes WHERE code = ? AND is_active = 1",
+        (code.upper(),)
+    ) as cursor:
+        promo = await cursor.fetchone()
+
+    if not promo:
+        return None, "❌ Промокод не найден или неактивен"
+
+    # Проверяем срок действия
+    if promo["expires_at"] > 0 and \
+            int(time.time()) > promo["expires_at"]:
+        return None, "⏰ Срок действия промокода истёк"
+
+    # Проверяем лимит использований
+    if promo["current_uses"] >= promo["max_uses"]:
+        return None, "📛 Промокод уже использован максимальное число раз"
+
+    # Проверяем, не использовал ли пользователь
+    async with db.execute(
+        "SELECT * FROM promo_uses WHERE user_id = ? AND promo_code = ?",
+        (user_id, code.upper())
+    ) as cursor:
+        used = await cursor.fetchone()
+
+    if used:
+        return None, "🚫 Вы уже использовали этот промокод"
+
+    # Активируем промокод
+    reward = promo["reward"]
+
+    await db.execute(
+        "UPDATE promo_codes SET current_uses = current_uses + 1 WHERE code = ?",
+        (code.upper(),)
+    )
+    await db.execute(
+        "INSERT INTO promo_uses (user_id, promo_code, used_at) VALUES (?, ?, ?)",
+        (user_id, code.upper(), int(time.time()))
+    )
+
+    # Начисляем награду в той же транзакции
+    await _apply_balance(
+        db, user_id, reward, f"Промокод: {code.upper()}"
+    )
 
     return reward, f"✅ Промокод активирован! Получено: {reward} 💰"
 
 
+async def use_promo(user_id: int, code: str):
+    return await _submit(
+        _use_promo, user_id, code, invalidates=(user_id,)
+    )
+
+
 async def get_all_promos():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         async with db.execute(
             "SELECT * FROM promo_codes ORDER BY created_at DESC"
         ) as cursor:
             return await cursor.fetchall()
 
 
+async def _delete_promo(db, code):
+    await db.execute(
+        "DELETE FROM promo_codes WHERE code = ?", (code.upper(),)
+    )
+
+
 async def delete_promo(code: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "DELETE FROM promo_codes WHERE code = ?", (code.upper(),)
-        )
-        await db.commit()
+    await _submit(_delete_promo, code)
 
 
 # ==================== INVENTORY ====================
 
+async def _add_to_inventory(db, user_id, item_id, item_name):
+    await db.execute(
+        """INSERT INTO inventory 
+        (user_id, item_id, item_name, purchased_at) 
+        VALUES (?, ?, ?, ?)""",
+        (user_id, item_id, item_name, int(time.time()))
+    )
+
+
 async def add_to_inventory(user_id: int, item_id: str, item_name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """INSERT INTO inventory 
-            (user_id, item_id, item_name, purchased_at) 
-            VALUES (?, ?, ?, ?)""",
-            (user_id, item_id, item_name, int(time.time()))
+    await _submit(_add_to_inventory, user_id, item_id, item_name)
+
+
+async def get_inventory(user_id: int, limit: int = 10,
+                        before=None, after=None):
+    """Страница инвентаря, новые покупки первыми.
+
+    before / after — курсор (purchased_at, id): страница старее
+    или новее курсора.
+    """
+    async with _read() as db:
+        rows = await _fetch_page(
+            db, "inventory", "purchased_at", user_id, limit, before, after
         )
-        await db.commit()
+    return _merge_page(rows, "purchased_at", limit, after)
+
+
+# ==================== PAGINATION ====================
+
+@lru_cache(maxsize=16)
+def _page_sql(table: str, order_col: str, direction: str):
+    """Запрос страницы с поиском по ключу (order_col, id) без OFFSET"""
+    condition = ""
+    order = "DESC"
+    if direction == "before":
+        condition = f"AND ({order_col}, id) < (?, ?) "
+    elif direction == "after":
+        condition = f"AND ({order_col}, id) > (?, ?) "
+        order = "ASC"
+    return (
+        f"SELECT * FROM {table} WHERE user_id = ? {condition}"
+        f"ORDER BY {order_col} {order}, id {order} LIMIT ?"
+    )
+
+
+async def _fetch_page(db, table, order_col, user_id, limit, before, after):
+    if before is not None:
+        direction, params = "before", (user_id, *before, limit)
+    elif after is not None:
+        direction, params = "after", (user_id, *after, limit)
+    else:
+        direction, params = "first", (user_id, limit)
+
+    async with db.execute(
+        _page_sql(table, order_col, direction), params
+    ) as cursor:
+        return list(await cursor.fetchall())
+
+
+def _merge_page(rows, order_col, limit, after=None):
+    """Склеить строки из разных источников в одну страницу"""
+    unique = {row["id"]: row for row in rows}
+    page = sorted(
+        unique.values(),
+        key=lambda row: (row[order_col], row["id"]),
+        reverse=after is None
+    )[:limit]
+    if after is not None:
+        page.reverse()
+    return page
 
 
-async def get_inventory(user_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+# ==================== TRANSACTIONS ====================
+
+async def get_transactions(user_id: int, limit: int = 10,
+                           before=None, after=None,
+                           archived: bool = False):
+    """Страница транзакций пользователя, новые первыми.
+
+    before / after — курсор (created_at, id): страница старее
+    или новее курсора. archived=True — дочитывать из архива,
+    если горячей таблицы не хватает на страницу.
+    """
+    async with _read() as db:
+        rows = await _fetch_page(
+            db, "transactions", "created_at", user_id, limit, before, after
+        )
+        # Архив старее горячей таблицы: для страниц «старее» он нужен,
+        # только если горячих строк не хватило
+        if archived and (after is not None or len(rows) < limit):
+            rows += await _fetch_page(
+                db, "archive.transactions", "created_at",
+                user_id, limit, before, after
+            )
+
+    # Досыпаем ещё не записанные строки из буфера
+    for row in _ledger:
+        if row["user_id"] != user_id:
+            continue
+        key = (row["created_at"], row["id"])
+        if before is not None and key >= tuple(before):
+            continue
+        if after is not None and key <= tuple(after):
+            continue
+        rows.append(row)
+
+    return _merge_page(rows, "created_at", limit, after)
+
+
+# ==================== BROADCASTS ====================
+
+async def _create_broadcast(db, admin_id, chat_id, status_message_id,
+                            text, total, segment):
+    async with db.execute(
+        """INSERT INTO broadcasts 
+        (admin_id, chat_id, status_message_id, text, total, segment, 
+         created_at) 
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (admin_id, chat_id, status_message_id, text, total, segment,
+         int(time.time()))
+    ) as cursor:
+        return cursor.lastrowid
+
+
+async def create_broadcast(admin_id: int, chat_id: int,
+                           status_message_id: int, text: str,
+                           total: int, segment: str = ""):
+    return await _submit(
+        _create_broadcast, admin_id, chat_id, status_message_id, text,
+        total, segment
+    )
+
+
+async def _save_broadcast(db, broadcast_id, last_user_id, sent, failed,
+                          blocked, finished):
+    await db.execute(
+        """UPDATE broadcasts 
+        SET last_user_id = ?, sent = ?, failed = ?, blocked = ?, 
+            status = ?, finished_at = ? 
+        WHERE id = ?""",
+        (last_user_id, sent, failed, blocked,
+         "done" if finished else "running",
+         int(time.time()) if finished else 0, broadcast_id)
+    )
+
+
+async def save_broadcast(broadcast_id: int, last_user_id: int, sent: int,
+                         failed: int, blocked: int, finished: bool = False):
+    """Сохранить прогресс рассылки (контрольная точка)"""
+    await _submit(
+        _save_broadcast, broadcast_id, last_user_id, sent, failed,
+        blocked, finished
+    )
+
+
+async def get_running_broadcasts():
+    async with _read() as db:
         async with db.execute(
-            "SELECT * FROM inventory WHERE user_id = ? ORDER BY purchased_at DESC",
-            (user_id,)
+            "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id"
         ) as cursor:
             return await cursor.fetchall()
 
 
-# ==================== TRANSACTIONS ====================
-
-async def get_transactions(user_id: int, limit: int = 10):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+# ==================== OUTBOX ====================
+
+async def _write_outbox(db, messages):
+    """Записать сообщения (chat_id, text) в открытой транзакции"""
+    global _outbox_enqueued
+    now = int(time.time())
+    await db.executemany(
+        """INSERT INTO outbox (chat_id, text, next_attempt_at, created_at) 
+        VALUES (?, ?, ?, ?)""",
+        [(chat_id, text, now, now) for chat_id, text in messages]
+    )
+    _outbox_enqueued = True
+
+
+async def get_due_outbox(limit: int = 100, skip_chats=()):
+    """Самое старое готовое к отправке сообщение каждого чата.
+
+    Не больше одного сообщения на чат, поэтому чат с длинной
+    очередью не задерживает остальные. skip_chats — чаты, которым
+    писать пока рано (пауза между сообщениями).
+    """
+    skip_chats = list(skip_chats)
+    skip = ""
+    if skip_chats:
+        skip = f"AND chat_id NOT IN ({', '.join('?' * len(skip_chats))})"
+    async with _read() as db:
         async with db.execute(
-            """SELECT * FROM transactions 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC LIMIT ?""",
-            (user_id, limit)
+            f"""SELECT id, chat_id, text, attempts FROM outbox 
+            WHERE id IN (
+                SELECT MIN(id) FROM outbox 
+                WHERE status = 'pending' AND next_attempt_at <= ? {skip} 
+                GROUP BY chat_id
+            ) 
+            ORDER BY id LIMIT ?""",
+            (int(time.time()), *skip_chats, limit)
         ) as cursor:
             return await cursor.fetchall()
 
 
-# ==================== SUPPORT ====================
+async def get_next_outbox_time():
+    """Время ближайшей запланированной попытки или None"""
+    async with _read() as db:
+        async with db.execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+        ) as cursor:
+            return (await cursor.fetchone())[0]
 
-async def create_ticket(user_id: int, message: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """INSERT INTO support_tickets 
-            (user_id, message, created_at) 
-            VALUES (?, ?, ?)""",
-            (user_id, message, int(time.time()))
+
+async def _finish_outbox(db, delivered, retries, failed):
+    if delivered:
+        await db.executemany(
+            "DELETE FROM outbox WHERE id = ?",
+            [(message_id,) for message_id in delivered]
+        )
+    if retries:
+        await db.executemany(
+            """UPDATE outbox 
+            SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? 
+            WHERE id = ?""",
+            retries
         )
-        await db.commit()
+    if failed:
+        await db.executemany(
+            """UPDATE outbox 
+            SET status = 'failed', attempts = attempts + 1, last_error = ? 
+            WHERE id = ?""",
+            failed
+        )
+
+
+async def finish_outbox(delivered=(), retries=(), failed=()):
+    """Записать итоги отправки одним коммитом.
+
+    delivered — id доставленных (удаляются);
+    retries — (next_attempt_at, ошибка, id) для повтора;
+    failed — (ошибка, id) окончательно не доставленных.
+    """
+    await _submit(
+        _finish_outbox, list(delivered), list(retries), list(failed)
+    )
+
+
+async def wait_outbox(timeout: float):
+    """Дождаться новых сообщений в outbox (или таймаута)"""
+    try:
+        await asyncio.wait_for(_outbox_wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    _outbox_wakeup.clear()
+
+
+# ==================== SUPPORT ====================
+
+async def _create_ticket(db, user_id, message):
+    await db.execute(
+        """INSERT INTO support_tickets 
+        (user_id, message, created_at) 
+        VALUES (?, ?, ?)""",
+        (user_id, message, int(time.time()))
+    )
+
+
+async def create_ticket(user_id: int, message: str, notify=()):
+    await _submit(_create_ticket, user_id, message, notify=notify)
 
 
 async def get_open_tickets():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         async with db.execute(
             "SELECT * FROM support_tickets WHERE status = 'open' ORDER BY created_at DESC"
         ) as cursor:
             return await cursor.fetchall()
 
 
-async def reply_ticket(ticket_id: int, reply: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """UPDATE support_tickets 
-            SET status = 'closed', admin_reply = ?, replied_at = ? 
-            WHERE id = ?""",
-            (reply, int(time.time()), ticket_id)
-        )
-        await db.commit()
+async def _reply_ticket(db, ticket_id, reply):
+    await db.execute(
+        """UPDATE support_tickets 
+        SET status = 'closed', admin_reply = ?, replied_at = ? 
+        WHERE id = ?""",
+        (reply, int(time.time()), ticket_id)
+    )
+
+
+async def reply_ticket(ticket_id: int, reply: str, notify=()):
+    await _submit(_reply_ticket, ticket_id, reply, notify=notify)
 
 
 async def get_ticket(ticket_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         async with db.execute(
             "SELECT * FROM support_tickets WHERE id = ?", (ticket_id,)
         ) as cursor:
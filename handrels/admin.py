@@ -6,11 +6,13 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
 from database import (
-    get_all_users_count, get_user, update_balance,
+    get_counters, expire_subscriptions, get_user, update_balance,
     update_user, create_promo, get_all_promos,
     delete_promo, get_open_tickets, reply_ticket,
-    get_ticket, get_all_user_ids
+    get_ticket
 )
+from broadcast import start_broadcast
+from segments import SEGMENTS_HELP, SegmentError, count
 from keyboards import admin_keyboard, back_to_menu_keyboard
 from config import ADMINS, CURRENCY_EMOJI
 
@@ -19,6 +21,7 @@ router = Router()
 
 class AdminStates(StatesGroup):
     waiting_promo_data = State()
+    waiting_broadcast_segment = State()
     waiting_broadcast = State()
     waiting_user_id = State()
     waiting_give_coins_id = State()
@@ -54,18 +57,18 @@ async def callback_admin_stats(callback: CallbackQuery):
     if not is_admin(callback.from_user.id):
         return
 
-    total_users = await get_all_users_count()
-    tickets = await get_open_tickets()
-    promos = await get_all_promos()
-    active_promos = len(
-        [p for p in promos if p["is_active"]]
-    )
+    # Истёкшие подписки не должны попадать в VIP/Premium
+    await expire_subscriptions()
+    counters = await get_counters()
 
     text = (
         f"📊 <b>Статистика бота</b>\n\n"
-        f"👥 Всего пользователей: <b>{total_users}</b>\n"
-        f"🎁 Активных промокодов: <b>{active_promos}</b>\n"
-        f"📋 Открытых тикетов: <b>{len(tickets)}</b>\n"
+        f"👥 Всего пользователей: <b>{counters['users']}</b>\n"
+        f"🚫 Забанено: <b>{counters['banned_users']}</b>\n"
+        f"👑 VIP: <b>{counters['vip_users']}</b>\n"
+        f"💎 Premium: <b>{counters['premium_users']}</b>\n"
+        f"🎁 Активных промокодов: <b>{counters['active_promos']}</b>\n"
+        f"📋 Открытых тикетов: <b>{counters['open_tickets']}</b>\n"
     )
 
     await callback.message.edit_text(
@@ -172,7 +175,33 @@ async def callback_admin_broadcast(callback: CallbackQuery,
 
     await callback.message.edit_text(
         "📨 <b>Рассылка</b>\n\n"
-        "Отправьте текст для рассылки всем пользователям:",
+        "Кому отправить? Напишите сегмент:\n\n"
+        f"{SEGMENTS_HELP}\n\n"
+        "Например: <code>active:7 and not vip</code>",
+        parse_mode="HTML"
+    )
+    await state.set_state(AdminStates.waiting_broadcast_segment)
+
+
+@router.message(AdminStates.waiting_broadcast_segment)
+async def process_broadcast_segment(message: Message,
+                                    state: FSMContext):
+    if not is_admin(message.from_user.id):
+        return
+
+    segment = message.text.strip()
+    if segment.lower() in ("все", "all"):
+        segment = ""
+    try:
+        total = count(segment)
+    except SegmentError as e:
+        await message.answer(f"❌ {e}\n\nПопробуйте ещё раз:")
+        return
+
+    await state.update_data(segment=segment, total=total)
+    await message.answer(
+        f"👥 Получателей: <b>{total}</b>\n\n"
+        f"Отправьте текст рассылки:",
         parse_mode="HTML"
     )
     await state.set_state(AdminStates.waiting_broadcast)
@@ -183,38 +212,19 @@ async def process_broadcast(message: Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return
 
-    user_ids = await get_all_user_ids()
-    sent = 0
-    failed = 0
+    data = await state.get_data()
+    segment = data.get("segment", "")
+    total = data.get("total", 0)
 
     status_msg = await message.answer(
-        f"📨 Рассылка запущена... 0/{len(user_ids)}"
+        f"📨 Рассылка запущена... 0/{total}"
     )
 
-    for user_id in user_ids:
-        try:
-            await message.bot.send_message(
-                user_id,
-                f"📢 <b>Объявление</b>\n\n{message.text}",
-                parse_mode="HTML"
-            )
-            sent += 1
-        except Exception:
-            failed += 1
-
-        if (sent + failed) % 50 == 0:
-            try:
-                await status_msg.edit_text(
-                    f"📨 Рассылка... {sent + failed}/{len(user_ids)}"
-                )
-            except Exception:
-                pass
-
-    await status_msg.edit_text(
-        f"✅ <b>Рассылка завершена!</b>\n\n"
-        f"📨 Отправлено: {sent}\n"
-        f"❌ Ошибок: {failed}",
-        parse_mode="HTML"
+    # Отправка идёт в фоне с ограничением скорости;
+    # прогресс обновляется в status_msg
+    await start_broadcast(
+        message.bot, message.from_user.id, status_msg.chat.id,
+        status_msg.message_id, message.text, total, segment
     )
     await state.clear()
 
@@ -333,8 +343,15 @@ async def process_give_coins_amount(message: Message,
     data = await state.get_data()
     target_user_id = data["target_user_id"]
 
+    # Уведомление пользователю — через outbox, в той же транзакции
     await update_balance(
-        target_user_id, amount, "Начислено администратором"
+        target_user_id, amount, "Начислено администратором",
+        notify=[(
+            target_user_id,
+            f"{'💰 Вам начислено' if amount > 0 else '💸 Списано'} "
+            f"<b>{abs(amount)}</b> {CURRENCY_EMOJI} "
+            f"администратором!"
+        )]
     )
 
     sign = "+" if amount > 0 else ""
@@ -344,18 +361,6 @@ async def process_give_coins_amount(message: Message,
         reply_markup=admin_keyboard(),
     )
 
-    # Уведомляем пользователя
-    try:
-        await message.bot.send_message(
-            target_user_id,
-            f"{'💰 Вам начислено' if amount > 0 else '💸 Списано'} "
-            f"<b>{abs(amount)}</b> {CURRENCY_EMOJI} "
-            f"администратором!",
-            parse_mode="HTML"
-        )
-    except Exception:
-        pass
-
     await state.clear()
 
 
@@ -478,24 +483,21 @@ async def process_ticket_reply(message: Message,
     ticket_id = data["ticket_id"]
 
     ticket = await get_ticket(ticket_id)
-    await reply_ticket(ticket_id, message.text)
+    # Ответ пользователю уходит через outbox
+    await reply_ticket(
+        ticket_id, message.text,
+        notify=[(
+            ticket["user_id"],
+            f"💬 <b>Ответ от поддержки</b>\n\n"
+            f"📋 Тикет #{ticket_id}\n"
+            f"📝 Ваш вопрос: {ticket['message']}\n\n"
+            f"💡 Ответ: {message.text}"
+        )]
+    )
 
     await message.answer(
         f"✅ Ответ на тикет #{ticket_id} отправлен!",
         reply_markup=admin_keyboard()
     )
 
-    # Уведомляем пользователя
-    try:
-        await message.bot.send_message(
-            ticket["user_id"],
-            f"💬 <b>Ответ от поддержки</b>\n\n"
-            f"📋 Тикет #{ticket_id}\n"
-            f"📝 Ваш вопрос: {ticket['message']}\n\n"
-            f"💡 Ответ: {message.text}",
-            parse_mode="HTML"
-        )
-    except Exception:
-        pass
-
     await state.clear()
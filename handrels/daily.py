@@ -15,10 +15,8 @@ DAILY_COOLDOWN = 24 * 3600  # 24 часа
 
 
 @router.callback_query(F.data == "daily")
-async def callback_daily(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        return
+async def callback_daily(callback: CallbackQuery, db_user):
+    user = db_user
 
     current_time = int(time.time())
     last_daily = user["last_daily"]
@@ -1,40 +1,42 @@
 # handlers/games.py
 
 import random
-import asyncio
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from database import (
-    get_user, update_balance, update_user, add_xp
+    place_bet, set_round_outcome, refund_round, settle_autoplay
 )
+from payouts import GAME_EMOJI, resolve, choice_multiplier, payout_table
+from scheduler import Round, schedule
 from keyboards import (
     games_keyboard, game_bet_keyboard,
-    coin_side_keyboard, number_guess_keyboard,
+    coin_side_keyboard, number_guess_keyboard, autoplay_bet_keyboard,
     back_to_menu_keyboard
 )
-from config import CURRENCY_EMOJI
+from templates import GAMES_MENU
+from config import (
+    CURRENCY_EMOJI, GAME_BETS, AUTOPLAY_ROUNDS, AUTOPLAY_GAMES
+)
 
 router = Router()
 
+# Опыт за раунд
+XP_WIN = 15
+XP_LOSS = 5
+
+# Названия игр в журнале транзакций (как у обычных раундов)
+LEDGER_NAMES = {
+    "coin": "Монетка",
+    "number": "Угадай число",
+    "dice": "dice",
+}
+
 
 @router.callback_query(F.data == "games")
 async def callback_games(callback: CallbackQuery):
-    text = (
-        f"🎮 <b>Мини-игры</b>\n\n"
-        f"Выбери игру и делай ставку!\n\n"
-        f"🎲 <b>Кости</b> — Кинь кости, 4+ побеждает\n"
-        f"🪙 <b>Монетка</b> — Угадай сторону\n"
-        f"🎰 <b>Слоты</b> — Крути барабаны\n"
-        f"🔢 <b>Угадай число</b> — Угадай от 1 до 10\n"
-        f"🎯 <b>Дартс</b> — Попади в цель\n"
-        f"⚽ <b>Футбол</b> — Забей гол\n"
-        f"🏀 <b>Баскетбол</b> — Забрось мяч\n"
-        f"🎳 <b>Боулинг</b> — Сбей кегли\n"
-    )
-
     await callback.message.edit_text(
-        text,
+        GAMES_MENU,
         reply_markup=games_keyboard(),
         parse_mode="HTML"
     )
@@ -43,9 +45,9 @@ async def callback_games(callback: CallbackQuery):
 # ============== Выбор ставки ==============
 
 @router.callback_query(F.data.startswith("game_"))
-async def callback_game_select(callback: CallbackQuery):
+async def callback_game_select(callback: CallbackQuery, db_user):
     game = callback.data.replace("game_", "")
-    user = await get_user(callback.from_user.id)
+    user = db_user
 
     game_names = {
         "dice": "🎲 Кости",
@@ -74,14 +76,18 @@ async def callback_game_select(callback: CallbackQuery):
 # ============== Обработка ставок ==============
 
 @router.callback_query(F.data.startswith("bet_"))
-async def callback_bet(callback: CallbackQuery):
+async def callback_bet(callback: CallbackQuery, db_user):
     parts = callback.data.split("_")
     game = parts[1]
     bet = int(parts[2])
+    # callback_data можно подделать — принимаем только ставки с кнопок
+    if game not in GAME_EMOJI or bet not in GAME_BETS:
+        await callback.answer()
+        return
 
-    user = await get_user(callback.from_user.id)
-
-    if user["balance"] < bet:
+    # Для монетки и числа сначала выбор — подсказываем заранее.
+    # Саму ставку проверяет атомарное списание в place_bet.
+    if game in ("coin", "number") and db_user["balance"] < bet:
         await callback.answer(
             "❌ Недостаточно средств!", show_alert=True
         )
@@ -102,7 +108,7 @@ async def callback_bet(callback: CallbackQuery):
             f"🔢 <b>Угадай число</b>\n\n"
             f"Ставка: {bet} {CURRENCY_EMOJI}\n"
             f"Угадайте число от 1 до 10:\n"
-            f"(Выигрыш x5!)",
+            f"(Выигрыш x{choice_multiplier('🔢')}!)",
             reply_markup=number_guess_keyboard(bet),
             parse_mode="HTML"
         )
@@ -115,124 +121,90 @@ async def callback_bet(callback: CallbackQuery):
 async def play_animated_game(callback: CallbackQuery, 
                               game: str, bet: int):
     """Игры с анимациями Telegram"""
-    user = await get_user(callback.from_user.id)
-    if user["balance"] < bet:
-        await callback.answer("❌ Недостаточно средств!", show_alert=True)
+    emoji = GAME_EMOJI.get(game, "🎲")
+
+    # Сначала списываем ставку — анимацию шлём, только если она прошла
+    round_id = await place_bet(callback.from_user.id, game, bet)
+    if round_id is None:
+        await callback.answer(
+            "❌ Недостаточно средств!", show_alert=True
+        )
         return
 
-    # Списываем ставку
-    await update_balance(
-        callback.from_user.id, -bet, f"Ставка: {game}"
-    )
+    # Отправляем анимацию
+    try:
+        msg = await callback.message.answer_dice(emoji=emoji)
+    except Exception:
+        await refund_round(round_id, callback.from_user.id)
+        raise
+    value = msg.dice.value
 
-    emoji_map = {
-        "dice": "🎲",
-        "slots": "🎰",
-        "darts": "🎯",
-        "football": "⚽",
-        "basketball": "🏀",
-        "bowling": "🎳"
-    }
+    # Результат — одна выборка из таблицы выплат
+    multiplier = resolve(emoji, value)
+    won = multiplier > 0
 
-    emoji = emoji_map.get(game, "🎲")
+    async def reveal(settlement):
+        await process_game_result(callback, bet, multiplier, settlement)
 
-    # Отправляем анимацию
-    msg = await callback.message.answer_dice(emoji=emoji)
-    value = msg.dice.value
+    # Исход уже виден игроку — сохраняем его, чтобы после перезапуска
+    # раунд рассчитался, а не вернулся
+    winnings = bet * multiplier if won else 0
+    xp = XP_WIN if won else XP_LOSS
+    await set_round_outcome(round_id, winnings, xp)
 
-    # Ждём анимацию
-    await asyncio.sleep(4)
-
-    # Определяем результат
-    won = False
-    multiplier = 2
-
-    if game == "dice":
-        won = value >= 4
-        multiplier = 2
-    elif game == "slots":
-        if value == 64:
-            won = True
-            multiplier = 10  # Джекпот
-        elif value in [1, 22, 43]:
-            won = True
-            multiplier = 5
-        else:
-            won = False
-    elif game == "darts":
-        won = value == 6  # Центр
-        multiplier = 5 if value == 6 else 0
-        if value >= 4:
-            won = True
-            multiplier = 2
-    elif game == "football":
-        won = value in [3, 4, 5]
-        multiplier = 2
-    elif game == "basketball":
-        won = value in [4, 5]
-        multiplier = 2
-    elif game == "bowling":
-        won = value == 6  # Страйк
-        multiplier = 3 if value == 6 else 0
-        if value >= 4:
-            won = True
-            multiplier = 2
-
-    # Обработка результата
-    await process_game_result(
-        callback, game, bet, won, multiplier, value
-    )
+    # Результат покажет планировщик после анимации — хендлер не ждёт
+    schedule(emoji, Round(
+        round_id, callback.from_user.id, game, bet, winnings, xp, reveal
+    ))
 
 
-async def process_game_result(callback, game, bet, won, 
-                                multiplier, value=None):
-    """Обработка результата игры"""
-    user_id = callback.from_user.id
+async def start_round(callback, emoji, game, bet, won, multiplier,
+                      reveal):
+    """Списать ставку и запланировать расчёт раунда.
 
-    # Обновляем статистику
-    user = await get_user(user_id)
-    await update_user(
-        user_id,
-        games_played=user["games_played"] + 1
+    Возвращает False, если не хватило средств.
+    """
+    winnings = bet * multiplier if won else 0
+    xp = XP_WIN if won else XP_LOSS
+    round_id = await place_bet(
+        callback.from_user.id, game, bet, winnings, xp
     )
-
-    if won:
-        winnings = bet * multiplier
-        await update_balance(
-            user_id, winnings, f"Выигрыш: {game}"
-        )
-        await update_user(
-            user_id,
-            games_won=user["games_won"] + 1
+    if round_id is None:
+        await callback.answer(
+            "❌ Недостаточно средств!", show_alert=True
         )
+        return False
+
+    schedule(emoji, Round(
+        round_id, callback.from_user.id, game, bet, winnings, xp, reveal
+    ))
+    return True
 
-        # XP за победу
-        leveled_up, new_level = await add_xp(user_id, 15)
+
+async def process_game_result(callback, bet, multiplier, result):
+    """Сообщение с результатом игры"""
+    if result.winnings > 0:
         level_text = ""
-        if leveled_up:
+        if result.leveled_up:
             level_text = (
-                f"\n🎉 Уровень повышен до <b>{new_level}</b>!"
+                f"\n🎉 Уровень повышен до <b>{result.level}</b>!"
             )
 
         text = (
             f"🎉 <b>ПОБЕДА!</b>\n\n"
             f"💰 Ставка: {bet} {CURRENCY_EMOJI}\n"
-            f"🏆 Выигрыш: <b>+{winnings}</b> {CURRENCY_EMOJI}\n"
+            f"🏆 Выигрыш: <b>+{result.winnings}</b> {CURRENCY_EMOJI}\n"
             f"📊 Множитель: x{multiplier}\n"
             f"{level_text}"
         )
     else:
-        # XP за участие
-        await add_xp(user_id, 5)
-
         text = (
             f"😔 <b>Проигрыш</b>\n\n"
             f"💸 Потеряно: {bet} {CURRENCY_EMOJI}\n"
             f"Попробуй ещё раз! 🍀"
         )
 
-    updated_user = await get_user(user_id)
-    text += f"\n\n💰 Баланс: {updated_user['balance']} {CURRENCY_EMOJI}"
+    text += f"\n\n💰 Баланс: {result.balance} {CURRENCY_EMOJI}"
 
     await callback.message.answer(
         text,
@@ -248,43 +220,37 @@ async def callback_coin_flip(callback: CallbackQuery):
     parts = callback.data.split("_")
     choice = parts[1]  # heads or tails
     bet = int(parts[2])
-
-    user = await get_user(callback.from_user.id)
-    if user["balance"] < bet:
-        await callback.answer(
-            "❌ Недостаточно средств!", show_alert=True
-        )
+    if choice not in ("heads", "tails") or bet not in GAME_BETS:
+        await callback.answer()
         return
 
-    # Списываем ставку
-    await update_balance(
-        callback.from_user.id, -bet, "Ставка: Монетка"
-    )
-
     # Бросаем монетку
     result = random.choice(["heads", "tails"])
     won = choice == result
+    multiplier = choice_multiplier("🪙")
 
     result_name = "🦅 Орёл" if result == "heads" else "🪙 Решка"
     choice_name = "🦅 Орёл" if choice == "heads" else "🪙 Решка"
 
-    await callback.message.edit_text(
-        f"🪙 <b>Подбрасываем монетку...</b>",
-        parse_mode="HTML"
-    )
+    async def reveal(settlement):
+        await process_game_result(callback, bet, multiplier, settlement)
 
-    await asyncio.sleep(2)
+        # Дополнительное сообщение о результате
+        result_text = (
+            f"\n🪙 Ваш выбор: {choice_name}\n"
+            f"🎲 Результат: {result_name}"
+        )
+        await callback.message.answer(result_text)
 
-    await process_game_result(
-        callback, "Монетка", bet, won, 2
-    )
+    if not await start_round(
+        callback, "🪙", "Монетка", bet, won, multiplier, reveal
+    ):
+        return
 
-    # Дополнительное сообщение о результате
-    result_text = (
-        f"\n🪙 Ваш выбор: {choice_name}\n"
-        f"🎲 Результат: {result_name}"
+    await callback.message.edit_text(
+        f"🪙 <b>Подбрасываем монетку...</b>",
+        parse_mode="HTML"
     )
-    await callback.message.answer(result_text)
 
 
 # ============== Угадай число ==============
@@ -294,36 +260,116 @@ async def callback_number_guess(callback: CallbackQuery):
     parts = callback.data.split("_")
     bet = int(parts[1])
     guess = int(parts[2])
-
-    user = await get_user(callback.from_user.id)
-    if user["balance"] < bet:
-        await callback.answer(
-            "❌ Недостаточно средств!", show_alert=True
-        )
+    if bet not in GAME_BETS or not 1 <= guess <= 10:
+        await callback.answer()
         return
 
-    # Списываем ставку
-    await update_balance(
-        callback.from_user.id, -bet, "Ставка: Угадай число"
-    )
-
     # Генерируем число
     correct = random.randint(1, 10)
     won = guess == correct
+    multiplier = choice_multiplier("🔢")
+
+    async def reveal(settlement):
+        await process_game_result(callback, bet, multiplier, settlement)
+
+        result_text = (
+            f"\n🔢 Ваш выбор: {guess}\n"
+            f"🎯 Загаданное число: {correct}"
+        )
+        await callback.message.answer(result_text)
+
+    if not await start_round(
+        callback, "🔢", "Угадай число", bet, won, multiplier, reveal
+    ):
+        return
 
     await callback.message.edit_text(
         f"🔢 <b>Генерируем число...</b>",
         parse_mode="HTML"
     )
 
-    await asyncio.sleep(2)
 
-    await process_game_result(
-        callback, "Угадай число", bet, won, 5
+# ============== Автоигра ==============
+
+@router.callback_query(F.data.startswith("autoplay_"))
+async def callback_autoplay(callback: CallbackQuery, db_user):
+    parts = callback.data.split("_")
+    game = parts[1]
+    rounds = int(parts[2])
+    if game not in AUTOPLAY_GAMES or rounds not in AUTOPLAY_ROUNDS:
+        await callback.answer()
+        return
+
+    await callback.message.edit_text(
+        f"🔁 <b>Автоигра ×{rounds}</b> — {GAME_EMOJI[game]}\n\n"
+        f"💰 Ваш баланс: <b>{db_user['balance']}</b> {CURRENCY_EMOJI}\n\n"
+        f"Ставка за раунд (списывается сразу за всю серию):",
+        reply_markup=autoplay_bet_keyboard(game, rounds),
+        parse_mode="HTML"
     )
 
-    result_text = (
-        f"\n🔢 Ваш выбор: {guess}\n"
-        f"🎯 Загаданное число: {correct}"
+
+def play_rounds(emoji: str, rounds: int):
+    """Множители rounds раундов по таблице выплат (серверный RNG)"""
+    table = payout_table(emoji)
+    last = len(table) - 1
+    return [table[random.randint(1, last)] for _ in range(rounds)]
+
+
+@router.callback_query(F.data.startswith("auto_"))
+async def callback_autoplay_run(callback: CallbackQuery, db_user):
+    parts = callback.data.split("_")
+    game = parts[1]
+    rounds = int(parts[2])
+    bet = int(parts[3])
+    # callback_data можно подделать — принимаем только ставки с кнопок
+    if (game not in AUTOPLAY_GAMES or rounds not in AUTOPLAY_ROUNDS
+            or bet not in GAME_BETS):
+        await callback.answer()
+        return
+
+    stake = bet * rounds
+    # Подсказка заранее; саму сумму проверяет атомарное списание
+    if db_user["balance"] < stake:
+        await callback.answer(
+            f"❌ Нужно {stake} {CURRENCY_EMOJI} на всю серию!",
+            show_alert=True
+        )
+        return
+
+    emoji = GAME_EMOJI[game]
+    multipliers = play_rounds(emoji, rounds)
+    wins = sum(1 for m in multipliers if m > 0)
+    winnings = bet * sum(multipliers)
+    xp = XP_WIN * wins + XP_LOSS * (rounds - wins)
+
+    result = await settle_autoplay(
+        callback.from_user.id, LEDGER_NAMES[game], bet, rounds, wins,
+        winnings, xp
+    )
+    if result is None:
+        await callback.answer(
+            "❌ Недостаточно средств!", show_alert=True
+        )
+        return
+
+    net = winnings - stake
+    level_text = ""
+    if result.leveled_up:
+        level_text = f"\n🎉 Уровень повышен до <b>{result.level}</b>!"
+
+    text = (
+        f"🔁 <b>Автоигра: {emoji} ×{rounds}</b>\n\n"
+        f"💰 Ставки: {bet} × {rounds} = {stake} {CURRENCY_EMOJI}\n"
+        f"🏆 Побед: {wins} из {rounds} ({wins * 100 // rounds}%)\n"
+        f"💵 Выигрыш: +{winnings} {CURRENCY_EMOJI}\n"
+        f"📊 Итог серии: <b>{net:+}</b> {CURRENCY_EMOJI}\n"
+        f"⭐ Опыт: +{xp} XP"
+        f"{level_text}\n\n"
+        f"💰 Баланс: {result.balance} {CURRENCY_EMOJI}"
+    )
+    await callback.message.edit_text(
+        text,
+        reply_markup=games_keyboard(),
+        parse_mode="HTML"
     )
-    await callback.message.answer(result_text)
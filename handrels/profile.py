@@ -5,55 +5,22 @@ from aiogram.types import CallbackQuery
 import time
 from datetime import datetime
 
-from database import (
-    get_user, add_user, get_transactions, get_inventory
-)
+from database import get_transactions, get_inventory
 from keyboards import (
-    profile_keyboard, back_to_menu_keyboard
+    profile_keyboard, back_to_menu_keyboard, page_keyboard
 )
 from config import CURRENCY_EMOJI
+from levels import get_rank, get_level_bar
 
 router = Router()
 
-
-def get_level_bar(xp: int, level: int):
-    """Прогресс-бар уровня"""
-    needed = level * 100
-    progress = int((xp / needed) * 10) if needed > 0 else 0
-    bar = "▓" * progress + "░" * (10 - progress)
-    return f"[{bar}] {xp}/{needed} XP"
-
-
-def get_rank(level: int):
-    """Получить ранг по уровню"""
-    ranks = {
-        1: "🌱 Новичок",
-        5: "⚔️ Воин",
-        10: "🛡️ Рыцарь",
-        20: "👑 Король",
-        30: "🏆 Легенда",
-        50: "🌟 Мифический",
-        75: "💫 Божественный",
-        100: "🔱 Создатель"
-    }
-    current_rank = "🌱 Новичок"
-    for min_level, rank in ranks.items():
-        if level >= min_level:
-            current_rank = rank
-    return current_rank
+# Строк на странице истории и инвентаря
+PAGE_SIZE = 10
 
 
 @router.callback_query(F.data == "profile")
-async def callback_profile(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        await add_user(
-            callback.from_user.id,
-            callback.from_user.username or "Нет",
-            callback.from_user.first_name or "Пользователь",
-            callback.from_user.last_name or ""
-        )
-        user = await get_user(callback.from_user.id)
+async def callback_profile(callback: CallbackQuery, db_user):
+    user = db_user
 
     # Формируем статус
     status_parts = []
@@ -114,11 +81,8 @@ async def callback_profile(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "balance")
-async def callback_balance(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        await callback.answer("❌ Профиль не найден!", show_alert=True)
-        return
+async def callback_balance(callback: CallbackQuery, db_user):
+    user = db_user
 
     text = (
         f"💰 <b>Баланс</b>\n\n"
@@ -137,10 +101,8 @@ async def callback_balance(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "stats")
-async def callback_stats(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        return
+async def callback_stats(callback: CallbackQuery, db_user):
+    user = db_user
 
     winrate = 0
     if user["games_played"] > 0:
@@ -172,15 +134,55 @@ async def callback_stats(callback: CallbackQuery):
     )
 
 
+def parse_page_cursor(data: str):
+    """callback_data вида <prefix>_<o|n>_<время>_<id> -> (before, after)"""
+    parts = data.split("_")
+    if len(parts) != 4:
+        return None, None
+    cursor = (int(parts[2]), int(parts[3]))
+    if parts[1] == "o":
+        return cursor, None
+    return None, cursor
+
+
+def split_page(rows, before, after):
+    """Обрезать лишнюю строку и понять, есть ли страницы рядом.
+
+    Запрашивается PAGE_SIZE + 1 строк: лишняя показывает, что в
+    направлении листания есть ещё страница.
+    """
+    has_more = len(rows) > PAGE_SIZE
+    if after is not None:
+        rows = rows[-PAGE_SIZE:]
+        has_newer, has_older = has_more, True
+    else:
+        rows = rows[:PAGE_SIZE]
+        has_newer, has_older = before is not None, has_more
+    return rows, has_newer, has_older
+
+
+def page_cursors(rows, time_key, has_newer, has_older):
+    newer = (rows[0][time_key], rows[0]["id"]) if has_newer else None
+    older = (rows[-1][time_key], rows[-1]["id"]) if has_older else None
+    return newer, older
+
+
 @router.callback_query(F.data == "inventory")
+@router.callback_query(F.data.startswith("inv_"))
 async def callback_inventory(callback: CallbackQuery):
-    items = await get_inventory(callback.from_user.id)
+    before, after = parse_page_cursor(callback.data)
+    items = await get_inventory(
+        callback.from_user.id, limit=PAGE_SIZE + 1,
+        before=before, after=after
+    )
+    items, has_newer, has_older = split_page(items, before, after)
 
     if not items:
         text = (
             f"🎒 <b>Инвентарь</b>\n\n"
             f"<i>Пусто... Загляни в магазин!</i> 🛒"
         )
+        keyboard = back_to_menu_keyboard()
     else:
         text = f"🎒 <b>Инвентарь</b>\n\n"
         for item in items:
@@ -191,25 +193,39 @@ async def callback_inventory(callback: CallbackQuery):
                 f"• {item['item_name']}\n"
                 f"  📅 Куплено: {purchase_date}\n\n"
             )
+        newer, older = page_cursors(
+            items, "purchased_at", has_newer, has_older
+        )
+        keyboard = page_keyboard("inv", newer, older)
 
     await callback.message.edit_text(
         text,
-        reply_markup=back_to_menu_keyboard(),
+        reply_markup=keyboard,
         parse_mode="HTML"
     )
 
 
 @router.callback_query(F.data == "transactions")
+@router.callback_query(F.data.startswith("txn_"))
 async def callback_transactions(callback: CallbackQuery):
-    txns = await get_transactions(callback.from_user.id, limit=10)
+    before, after = parse_page_cursor(callback.data)
+    txns = await get_transactions(
+        callback.from_user.id, limit=PAGE_SIZE + 1,
+        before=before, after=after, archived=True
+    )
+    txns, has_newer, has_older = split_page(txns, before, after)
 
     if not txns:
         text = (
             f"📜 <b>История транзакций</b>\n\n"
             f"<i>Пока транзакций нет</i>"
         )
+        keyboard = back_to_menu_keyboard()
     else:
-        text = f"📜 <b>Последние 10 транзакций</b>\n\n"
+        if has_newer:
+            text = f"📜 <b>История транзакций</b>\n\n"
+        else:
+            text = f"📜 <b>Последние {PAGE_SIZE} транзакций</b>\n\n"
         for txn in txns:
             emoji = "📈" if txn["amount"] > 0 else "📉"
             sign = "+" if txn["amount"] > 0 else ""
@@ -221,9 +237,13 @@ async def callback_transactions(callback: CallbackQuery):
                 f" — {txn['description']}\n"
                 f"   🕐 {txn_date}\n\n"
             )
+        newer, older = page_cursors(
+            txns, "created_at", has_newer, has_older
+        )
+        keyboard = page_keyboard("txn", newer, older)
 
     await callback.message.edit_text(
         text,
-        reply_markup=back_to_menu_keyboard(),
+        reply_markup=keyboard,
         parse_mode="HTML"
-  )
+    )
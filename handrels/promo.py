@@ -7,6 +7,7 @@ from aiogram.fsm.context import FSMContext
 
 from database import use_promo, add_xp
 from keyboards import promo_keyboard, back_to_menu_keyboard
+from templates import PROMO_INTRO
 
 router = Router()
 
@@ -17,17 +18,8 @@ class PromoStates(StatesGroup):
 
 @router.callback_query(F.data == "promo")
 async def callback_promo(callback: CallbackQuery):
-    text = (
-        f"🎁 <b>Промокоды</b>\n\n"
-        f"Введите промокод, чтобы получить награду!\n\n"
-        f"💡 Промокоды можно найти:\n"
-        f"• В нашем канале\n"
-        f"• В розыгрышах\n"
-        f"• У партнёров\n"
-    )
-
     await callback.message.edit_text(
-        text,
+        PROMO_INTRO,
         reply_markup=promo_keyboard(),
         parse_mode="HTML"
     )
@@ -3,7 +3,6 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
-from database import get_user
 from keyboards import referral_keyboard, back_to_menu_keyboard
 from config import REFERRAL_BONUS_INVITER, REFERRAL_BONUS_INVITED
 
@@ -11,8 +10,8 @@ router = Router()
 
 
 @router.callback_query(F.data == "referral")
-async def callback_referral(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
+async def callback_referral(callback: CallbackQuery, db_user):
+    user = db_user
     bot_info = await callback.bot.get_me()
     bot_username = bot_info.username
 
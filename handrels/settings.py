@@ -3,7 +3,8 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
-from database import get_user, update_user, get_top_users
+from database import get_user, update_user, get_users
+from leaderboard import leaderboard
 from keyboards import (
     settings_keyboard, confirm_reset_keyboard,
     leaderboard_keyboard, back_to_menu_keyboard
@@ -16,10 +17,8 @@ router = Router()
 # ==================== НАСТРОЙКИ ====================
 
 @router.callback_query(F.data == "settings")
-async def callback_settings(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        return
+async def callback_settings(callback: CallbackQuery, db_user):
+    user = db_user
 
     text = (
         f"⚙️ <b>Настройки</b>\n\n"
@@ -34,9 +33,9 @@ async def callback_settings(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "toggle_notifications")
-async def callback_toggle_notifications(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    new_value = 0 if user["notifications"] else 1
+async def callback_toggle_notifications(callback: CallbackQuery,
+                                        db_user):
+    new_value = 0 if db_user["notifications"] else 1
 
     await update_user(
         callback.from_user.id, notifications=new_value
@@ -73,7 +72,7 @@ async def callback_reset_stats(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "confirm_reset_stats")
-async def callback_confirm_reset(callback: CallbackQuery):
+async def callback_confirm_reset(callback: CallbackQuery, db_user):
     await update_user(
         callback.from_user.id,
         games_played=0,
@@ -84,11 +83,11 @@ async def callback_confirm_reset(callback: CallbackQuery):
         "✅ Статистика игр сброшена!", show_alert=True
     )
 
-    user = await get_user(callback.from_user.id)
+    # Сброс не трогает настройки — клавиатура строится по db_user
     await callback.message.edit_text(
         f"⚙️ <b>Настройки</b>\n\n"
         f"✅ Статистика успешно сброшена!",
-        reply_markup=settings_keyboard(user),
+        reply_markup=settings_keyboard(db_user),
         parse_mode="HTML"
     )
 
@@ -124,7 +123,9 @@ async def callback_top(callback: CallbackQuery):
         return
 
     order_by, title, unit = category_map[category]
-    users = await get_top_users(limit=10, order_by=order_by)
+    top = leaderboard.top(order_by, limit=10)
+    users = await get_users([user_id for user_id, _ in top])
+    values = dict(top)
 
     medals = ["🥇", "🥈", "🥉"]
 
@@ -132,7 +133,7 @@ async def callback_top(callback: CallbackQuery):
 
     for i, user in enumerate(users):
         medal = medals[i] if i < 3 else f"  {i + 1}."
-        value = user[order_by]
+        value = values[user["user_id"]]
 
         name = user["first_name"]
         if user["is_premium"]:
@@ -146,6 +147,14 @@ async def callback_top(callback: CallbackQuery):
     if not users:
         text += "<i>Пока никого нет</i>"
 
+    my_rank = leaderboard.rank(order_by, callback.from_user.id)
+    if my_rank is not None:
+        place, value = my_rank
+        text += (
+            f"\n📍 Ваше место: <b>{place}</b> из {len(leaderboard)}"
+            f" — {value} {unit}"
+        )
+
     await callback.message.edit_text(
         text,
         reply_markup=leaderboard_keyboard(),
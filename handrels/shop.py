@@ -6,33 +6,20 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from database import (
-    get_user, update_balance, update_user,
-    add_to_inventory, add_xp
+    update_balance, update_user, add_to_inventory, add_xp, try_debit
 )
-from keyboards import shop_keyboard, buy_confirm_keyboard, back_to_menu_keyboard
+from keyboards import (
+    shop_keyboard, buy_confirm_keyboard, back_to_menu_keyboard
+)
+from templates import SHOP_HEAD, SHOP_TAIL
 from config import SHOP_ITEMS, CURRENCY_EMOJI
 
 router = Router()
 
 
 @router.callback_query(F.data == "shop")
-async def callback_shop(callback: CallbackQuery):
-    user = await get_user(callback.from_user.id)
-    if not user:
-        return
-
-    text = (
-        f"🛒 <b>Магазин</b>\n\n"
-        f"💰 Ваш баланс: <b>{user['balance']}</b> {CURRENCY_EMOJI}\n\n"
-        f"Выберите товар для покупки:\n\n"
-    )
-
-    for item_id, item in SHOP_ITEMS.items():
-        text += (
-            f"{item['emoji']} <b>{item['name']}</b>\n"
-            f"   📝 {item['description']}\n"
-            f"   💵 Цена: {item['price']} {CURRENCY_EMOJI}\n\n"
-        )
+async def callback_shop(callback: CallbackQuery, db_user):
+    text = SHOP_HEAD + str(db_user["balance"]) + SHOP_TAIL
 
     await callback.message.edit_text(
         text,
@@ -42,7 +29,7 @@ async def callback_shop(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("buy_"))
-async def callback_buy_item(callback: CallbackQuery):
+async def callback_buy_item(callback: CallbackQuery, db_user):
     item_id = callback.data.replace("buy_", "")
 
     if item_id not in SHOP_ITEMS:
@@ -50,7 +37,7 @@ async def callback_buy_item(callback: CallbackQuery):
         return
 
     item = SHOP_ITEMS[item_id]
-    user = await get_user(callback.from_user.id)
+    user = db_user
 
     text = (
         f"🛒 <b>Подтверждение покупки</b>\n\n"
@@ -91,21 +78,17 @@ async def callback_confirm_buy(callback: CallbackQuery):
         return
 
     item = SHOP_ITEMS[item_id]
-    user = await get_user(callback.from_user.id)
 
-    if user["balance"] < item["price"]:
+    # Проверка и списание — одним условным UPDATE
+    paid, _ = await try_debit(
+        callback.from_user.id, item["price"], f"Покупка: {item['name']}"
+    )
+    if not paid:
         await callback.answer(
             "❌ Недостаточно средств!", show_alert=True
         )
         return
 
-    # Списываем деньги
-    await update_balance(
-        callback.from_user.id,
-        -item["price"],
-        f"Покупка: {item['name']}"
-    )
-
     # Применяем эффект
     result_text = ""
 
@@ -4,8 +4,9 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart, Command
 
-from database import add_user, get_user, update_balance, update_user
+from database import add_user, update_balance, increment_user
 from keyboards import main_menu_keyboard
+from templates import ABOUT_HEAD, ABOUT_TAIL
 from config import (
     BOT_NAME, BOT_VERSION, REFERRAL_BONUS_INVITER,
     REFERRAL_BONUS_INVITED, ADMINS
@@ -39,32 +40,25 @@ async def cmd_start(message: Message):
     )
 
     if is_new and referrer_id > 0:
-        # Начисляем бонусы
-        referrer = await get_user(referrer_id)
+        # Засчитываем реферала (None — пригласившего нет в базе)
+        referrer = await increment_user(referrer_id, referral_count=1)
         if referrer:
+            # Начисляем бонусы
+            # Уведомление уходит через outbox вместе с начислением
             await update_balance(
                 referrer_id, REFERRAL_BONUS_INVITER,
-                "Реферальный бонус (пригласил)"
+                "Реферальный бонус (пригласил)",
+                notify=[(
+                    referrer_id,
+                    f"🎉 По вашей ссылке зарегистрировался "
+                    f"<b>{user.first_name}</b>!\n"
+                    f"💰 Вы получили {REFERRAL_BONUS_INVITER} монет!"
+                )]
             )
             await update_balance(
                 user.id, REFERRAL_BONUS_INVITED,
                 "Реферальный бонус (приглашён)"
             )
-            await update_user(
-                referrer_id,
-                referral_count=referrer["referral_count"] + 1
-            )
-
-            try:
-                await message.bot.send_message(
-                    referrer_id,
-                    f"🎉 По вашей ссылке зарегистрировался "
-                    f"<b>{user.first_name}</b>!\n"
-                    f"💰 Вы получили {REFERRAL_BONUS_INVITER} монет!",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
 
     welcome_text = (
         f"{'🎉 Добро пожаловать' if is_new else '👋 С возвращением'}, "
@@ -89,14 +83,6 @@ async def cmd_start(message: Message):
 @router.callback_query(F.data == "menu")
 async def callback_menu(callback: CallbackQuery):
     user = callback.from_user
-    db_user = await get_user(user.id)
-
-    if not db_user:
-        await add_user(
-            user.id, user.username or "Нет",
-            user.first_name or "Пользователь",
-            user.last_name or ""
-        )
 
     await callback.message.edit_text(
         f"🏠 <b>Главное меню</b>\n\n"
@@ -112,22 +98,7 @@ async def callback_about(callback: CallbackQuery):
     from database import get_all_users_count
     users_count = await get_all_users_count()
 
-    text = (
-        f"ℹ️ <b>О боте</b>\n\n"
-        f"🤖 {BOT_NAME}\n"
-        f"📌 Версия: {BOT_VERSION}\n"
-        f"👥 Пользователей: {users_count}\n\n"
-        f"<b>Возможности:</b>\n"
-        f"• 🎮 8 мини-игр\n"
-        f"• 🛒 Магазин предметов\n"
-        f"• 🎁 Промокоды\n"
-        f"• 📅 Ежедневные бонусы\n"
-        f"• 👥 Реферальная система\n"
-        f"• 🏆 Рейтинги игроков\n"
-        f"• 💬 Система поддержки\n"
-        f"• ⚙️ Настройки\n\n"
-        f"Разработано с ❤️"
-    )
+    text = f"{ABOUT_HEAD}{users_count}{ABOUT_TAIL}"
 
     from keyboards import back_to_menu_keyboard
     await callback.message.edit_text(
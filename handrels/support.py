@@ -7,6 +7,7 @@ from aiogram.fsm.context import FSMContext
 
 from database import create_ticket, get_user
 from keyboards import support_keyboard, back_to_menu_keyboard
+from templates import FAQ
 from config import ADMINS
 
 router = Router()
@@ -47,7 +48,18 @@ async def callback_create_ticket(callback: CallbackQuery,
 @router.message(SupportStates.waiting_for_message)
 async def process_ticket_message(message: Message, 
                                   state: FSMContext):
-    await create_ticket(message.from_user.id, message.text)
+    # Уведомления админам уходят через outbox вместе с тикетом
+    alert = (
+        f"📩 <b>Новый тикет!</b>\n\n"
+        f"👤 От: {message.from_user.first_name} "
+        f"(@{message.from_user.username})\n"
+        f"🆔 ID: {message.from_user.id}\n\n"
+        f"💬 Сообщение:\n{message.text}"
+    )
+    await create_ticket(
+        message.from_user.id, message.text,
+        notify=[(admin_id, alert) for admin_id in ADMINS]
+    )
 
     await message.answer(
         f"✅ <b>Тикет создан!</b>\n\n"
@@ -58,46 +70,13 @@ async def process_ticket_message(message: Message,
         parse_mode="HTML"
     )
 
-    # Уведомляем админов
-    for admin_id in ADMINS:
-        try:
-            await message.bot.send_message(
-                admin_id,
-                f"📩 <b>Новый тикет!</b>\n\n"
-                f"👤 От: {message.from_user.first_name} "
-                f"(@{message.from_user.username})\n"
-                f"🆔 ID: {message.from_user.id}\n\n"
-                f"💬 Сообщение:\n{message.text}",
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass
-
     await state.clear()
 
 
 @router.callback_query(F.data == "faq")
 async def callback_faq(callback: CallbackQuery):
-    text = (
-        f"❓ <b>FAQ — Частые вопросы</b>\n\n"
-        f"<b>Q: Как заработать монеты?</b>\n"
-        f"A: Играйте в мини-игры, получайте ежедневные "
-        f"бонусы, приглашайте друзей!\n\n"
-        f"<b>Q: Как активировать промокод?</b>\n"
-        f"A: Нажмите «🎁 Промокод» → «🔑 Ввести промокод»\n\n"
-        f"<b>Q: Как пригласить друга?</b>\n"
-        f"A: Перейдите в раздел «👥 Рефералы» "
-        f"и поделитесь ссылкой\n\n"
-        f"<b>Q: Что даёт VIP/Premium?</b>\n"
-        f"A: Увеличенные ежедневные бонусы "
-        f"и особый статус в профиле\n\n"
-        f"<b>Q: Как работают уровни?</b>\n"
-        f"A: Выполняйте действия (игры, покупки, бонусы) "
-        f"чтобы получать XP и повышать уровень"
-    )
-
     await callback.message.edit_text(
-        text,
+        FAQ,
         reply_markup=back_to_menu_keyboard(),
         parse_mode="HTML"
   )
@@ -1,12 +1,19 @@
 # keyboards.py
+#
+# Клавиатуры собираются один раз и переиспользуются: статичные —
+# при импорте, параметрические — кэшем по аргументам. Возвращаемые
+# объекты общие, изменять их нельзя.
+
+from functools import cache, lru_cache
 
 from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton, 
     ReplyKeyboardMarkup, KeyboardButton
 )
-from config import SHOP_ITEMS
+from config import SHOP_ITEMS, GAME_BETS, AUTOPLAY_ROUNDS, AUTOPLAY_GAMES
 
 
+@cache
 def main_menu_keyboard():
     """Главное меню"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -41,6 +48,7 @@ def main_menu_keyboard():
     return keyboard
 
 
+@cache
 def back_to_menu_keyboard():
     """Кнопка назад в меню"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -48,6 +56,7 @@ def back_to_menu_keyboard():
     ])
 
 
+@cache
 def profile_keyboard():
     """Клавиатура профиля"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -65,6 +74,28 @@ def profile_keyboard():
     ])
 
 
+def page_keyboard(prefix: str, newer=None, older=None):
+    """Листание страниц: курсор (время, id) передаётся в callback_data"""
+    row = []
+    if newer:
+        row.append(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=f"{prefix}_n_{newer[0]}_{newer[1]}"
+        ))
+    if older:
+        row.append(InlineKeyboardButton(
+            text="Старее ➡️",
+            callback_data=f"{prefix}_o_{older[0]}_{older[1]}"
+        ))
+
+    buttons = [row] if row else []
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Главное меню", callback_data="menu")
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@cache
 def shop_keyboard():
     """Клавиатура магазина"""
     buttons = []
@@ -81,6 +112,7 @@ def shop_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=128)
 def buy_confirm_keyboard(item_id: str):
     """Подтверждение покупки"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -97,6 +129,7 @@ def buy_confirm_keyboard(item_id: str):
     ])
 
 
+@cache
 def games_keyboard():
     """Клавиатура игр"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -140,39 +173,51 @@ def games_keyboard():
     ])
 
 
+@lru_cache(maxsize=128)
 def game_bet_keyboard(game: str):
     """Клавиатура ставок"""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text="10 💰", callback_data=f"bet_{game}_10"
-            ),
-            InlineKeyboardButton(
-                text="50 💰", callback_data=f"bet_{game}_50"
-            ),
-            InlineKeyboardButton(
-                text="100 💰", callback_data=f"bet_{game}_100"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text="250 💰", callback_data=f"bet_{game}_250"
-            ),
-            InlineKeyboardButton(
-                text="500 💰", callback_data=f"bet_{game}_500"
-            ),
-            InlineKeyboardButton(
-                text="1000 💰", callback_data=f"bet_{game}_1000"
-            )
-        ],
-        [
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{bet} 💰", callback_data=f"bet_{game}_{bet}"
+        )
+        for bet in GAME_BETS
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    if game in AUTOPLAY_GAMES:
+        rows.append([
             InlineKeyboardButton(
-                text="🔙 К играм", callback_data="games"
+                text=f"🔁 Авто ×{rounds}",
+                callback_data=f"autoplay_{game}_{rounds}"
             )
-        ]
+            for rounds in AUTOPLAY_ROUNDS
+        ])
+    rows.append([
+        InlineKeyboardButton(
+            text="🔙 К играм", callback_data="games"
+        )
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=128)
+def autoplay_bet_keyboard(game: str, rounds: int):
+    """Ставка за раунд для автоигры"""
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{bet} 💰", callback_data=f"auto_{game}_{rounds}_{bet}"
+        )
+        for bet in GAME_BETS
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    rows.append([
+        InlineKeyboardButton(
+            text="🔙 Назад", callback_data=f"game_{game}"
+        )
     ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@lru_cache(maxsize=128)
 def coin_side_keyboard(bet: int):
     """Выбор стороны монетки"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -192,6 +237,7 @@ def coin_side_keyboard(bet: int):
     ])
 
 
+@lru_cache(maxsize=128)
 def number_guess_keyboard(bet: int):
     """Клавиатура угадай число"""
     buttons = []
@@ -211,6 +257,7 @@ def number_guess_keyboard(bet: int):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cache
 def promo_keyboard():
     """Клавиатура промокодов"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -252,6 +299,7 @@ def referral_keyboard(user_id: int, bot_username: str):
     ])
 
 
+@cache
 def leaderboard_keyboard():
     """Клавиатура лидерборда"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -285,7 +333,12 @@ def leaderboard_keyboard():
 
 def settings_keyboard(user):
     """Клавиатура настроек"""
-    notif_status = "🔔 Вкл" if user["notifications"] else "🔕 Выкл"
+    return _settings_keyboard(bool(user["notifications"]))
+
+
+@lru_cache(maxsize=2)
+def _settings_keyboard(notifications: bool):
+    notif_status = "🔔 Вкл" if notifications else "🔕 Выкл"
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
@@ -307,6 +360,7 @@ def settings_keyboard(user):
     ])
 
 
+@cache
 def confirm_reset_keyboard():
     """Подтверждение сброса"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -323,6 +377,7 @@ def confirm_reset_keyboard():
     ])
 
 
+@cache
 def support_keyboard():
     """Клавиатура поддержки"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -354,6 +409,7 @@ def support_keyboard():
 
 # ==================== ADMIN ====================
 
+@cache
 def admin_keyboard():
     """Админ клавиатура"""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -406,3 +462,12 @@ def admin_keyboard():
             )
         ]
     ])
+
+
+# Статичные клавиатуры собираем сразу при импорте
+for _build in (
+    main_menu_keyboard, back_to_menu_keyboard, profile_keyboard,
+    shop_keyboard, games_keyboard, promo_keyboard, leaderboard_keyboard,
+    confirm_reset_keyboard, support_keyboard, admin_keyboard,
+):
+    _build()
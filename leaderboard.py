@@ -0,0 +1,117 @@
+# leaderboard.py
+
+from sortedcontainers import SortedList
+
+from database import add_user_listener
+
+# Колонки, по которым строятся рейтинги (все есть в TRACKED_COLUMNS)
+LEADERBOARD_COLUMNS = ("balance", "level", "games_won", "referral_count")
+
+
+class Leaderboard:
+    """Рейтинги в памяти, обновляемые по изменениям пользователей.
+
+    На каждую колонку — отсортированный список (-значение, user_id),
+    так что топ читается срезом с начала. Забаненные в списки не
+    попадают, но их значения храним, чтобы вернуть после разбана.
+    """
+
+    def __init__(self, columns=LEADERBOARD_COLUMNS):
+        self.columns = columns
+        self._boards = {column: SortedList() for column in columns}
+        # user_id -> значения колонок в порядке self.columns
+        self._values = {}
+        self._banned = set()
+
+    def clear(self):
+        for board in self._boards.values():
+            board.clear()
+        self._values.clear()
+        self._banned.clear()
+
+    def add_rows(self, rows):
+        """Загрузить строки пользователей; списки соберёт build()"""
+        for row in rows:
+            user_id = row["user_id"]
+            self._values[user_id] = tuple(
+                row[column] for column in self.columns
+            )
+            if row["is_banned"]:
+                self._banned.add(user_id)
+
+    def build(self):
+        """Собрать списки по загруженным значениям одной сортировкой"""
+        for index, column in enumerate(self.columns):
+            self._boards[column] = SortedList(
+                (-values[index], user_id)
+                for user_id, values in self._values.items()
+                if user_id not in self._banned
+            )
+
+    def _remove(self, user_id: int):
+        values = self._values.get(user_id)
+        if values is None or user_id in self._banned:
+            return
+        for column, value in zip(self.columns, values):
+            self._boards[column].remove((-value, user_id))
+
+    def _insert(self, user_id: int):
+        values = self._values[user_id]
+        for column, value in zip(self.columns, values):
+            self._boards[column].add((-value, user_id))
+
+    def update(self, row):
+        """Применить новые значения строки пользователя"""
+        user_id = row["user_id"]
+        values = tuple(row[column] for column in self.columns)
+        banned = bool(row["is_banned"])
+
+        was_banned = user_id in self._banned
+        if self._values.get(user_id) == values and was_banned == banned:
+            return
+
+        self._remove(user_id)
+        self._values[user_id] = values
+        if banned:
+            self._banned.add(user_id)
+        else:
+            self._banned.discard(user_id)
+            self._insert(user_id)
+
+    def top(self, column: str, limit: int = 10):
+        """Первые limit мест: список (user_id, значение)"""
+        return [
+            (user_id, -value)
+            for value, user_id in self._boards[column].islice(0, limit)
+        ]
+
+    def rank(self, column: str, user_id: int):
+        """Место пользователя в рейтинге: (место, значение) или None.
+
+        Место — число пользователей со строго большим значением плюс
+        один, поэтому при равенстве места делятся. bisect по
+        SortedList работает за O(log n).
+        """
+        values = self._values.get(user_id)
+        if values is None or user_id in self._banned:
+            return None
+        value = values[self.columns.index(column)]
+        # (-value,) меньше любого (-value, user_id)
+        return self._boards[column].bisect_left((-value,)) + 1, value
+
+    def __len__(self):
+        return len(self._values) - len(self._banned)
+
+
+leaderboard = Leaderboard()
+
+
+def init_leaderboard():
+    """Собрать рейтинги и подписаться на изменения.
+
+    Строки загружаются через leaderboard.add_rows за тот же проход по
+    пользователям, что строит сегменты (init_segments). Вызывается при
+    старте, до приёма апдейтов.
+    """
+    leaderboard.build()
+    add_user_listener(leaderboard.update)
@@ -0,0 +1,68 @@
+# levels.py
+
+from bisect import bisect_right
+from math import isqrt
+
+# Переход с уровня L на L+1 стоит L * XP_PER_LEVEL опыта,
+# поэтому пороги уровней — арифметическая прогрессия
+XP_PER_LEVEL = 100
+
+# Ранги: минимальный уровень -> название (по возрастанию)
+RANK_LEVELS = (1, 5, 10, 20, 30, 50, 75, 100)
+RANK_NAMES = (
+    "🌱 Новичок",
+    "⚔️ Воин",
+    "🛡️ Рыцарь",
+    "👑 Король",
+    "🏆 Легенда",
+    "🌟 Мифический",
+    "💫 Божественный",
+    "🔱 Создатель",
+)
+
+# Все 11 вариантов прогресс-бара
+LEVEL_BARS = tuple("▓" * i + "░" * (10 - i) for i in range(11))
+
+
+def level_start(level: int) -> int:
+    """Суммарный опыт, с которого начинается уровень"""
+    return XP_PER_LEVEL * level * (level - 1) // 2
+
+
+def level_for_total(total: int) -> int:
+    """Уровень по суммарному опыту (решение квадратного неравенства)"""
+    k = 2 * max(total, 0) // XP_PER_LEVEL
+    return (1 + isqrt(1 + 4 * k)) // 2
+
+
+def apply_xp(xp: int, level: int, gained: int):
+    """Новые (xp, level) после получения опыта"""
+    total = level_start(level) + xp + gained
+    new_level = level_for_total(total)
+    return total - level_start(new_level), new_level
+
+
+def level_after_xp(xp: int, level: int, gained: int) -> int:
+    return apply_xp(xp, level, gained)[1]
+
+
+def xp_after_xp(xp: int, level: int, gained: int) -> int:
+    return apply_xp(xp, level, gained)[0]
+
+
+def previous_level(xp: int, level: int, gained: int) -> int:
+    """Уровень до начисления gained, если известны новые xp и level"""
+    return level_for_total(level_start(level) + xp - gained)
+
+
+def get_rank(level: int) -> str:
+    """Получить ранг по уровню"""
+    index = bisect_right(RANK_LEVELS, level) - 1
+    return RANK_NAMES[max(index, 0)]
+
+
+def get_level_bar(xp: int, level: int) -> str:
+    """Прогресс-бар уровня"""
+    needed = level * XP_PER_LEVEL
+    progress = min(xp * 10 // needed, 10) if needed > 0 else 0
+    return f"[{LEVEL_BARS[progress]}] {xp}/{needed} XP"
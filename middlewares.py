@@ -0,0 +1,44 @@
+# middlewares.py
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from database import get_user, add_user, update_user
+
+
+def _is_start_command(event: Update) -> bool:
+    # /start регистрирует пользователя сам — с учётом реферальной ссылки
+    message = event.message
+    return bool(
+        message and message.text and message.text.startswith("/start")
+    )
+
+
+class UserMiddleware(BaseMiddleware):
+    """Загружает пользователя из базы один раз на апдейт.
+
+    Если профиля ещё нет — регистрирует его. Хендлеры получают
+    строку пользователя в аргументе db_user.
+    """
+
+    async def __call__(self, handler, event: Update, data: dict):
+        tg_user = data.get("event_from_user")
+        db_user = None
+
+        if tg_user is not None:
+            db_user = await get_user(tg_user.id)
+            if db_user is None and not _is_start_command(event):
+                await add_user(
+                    tg_user.id,
+                    tg_user.username or "Нет",
+                    tg_user.first_name or "Пользователь",
+                    tg_user.last_name or ""
+                )
+                db_user = await get_user(tg_user.id)
+            elif db_user is not None and not db_user["is_reachable"]:
+                # Пользователь снова пишет боту — рассылки ему доходят
+                await update_user(tg_user.id, is_reachable=1)
+                db_user = await get_user(tg_user.id)
+
+        data["db_user"] = db_user
+        return await handler(event, data)
@@ -0,0 +1,157 @@
+# outbox.py
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+)
+
+from broadcast import rate_limiter
+from config import (
+    OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_CHAT_INTERVAL_MS,
+    OUTBOX_POLL_SEC
+)
+from database import (
+    get_due_outbox, get_next_outbox_time, finish_outbox, wait_outbox,
+    update_user
+)
+
+logger = logging.getLogger(__name__)
+
+# Сообщений (чатов) за один проход диспетчера
+BATCH_SIZE = 100
+# Минимальная пауза ожидания, чтобы не крутить пустой цикл
+MIN_WAIT = 0.05
+
+_task = None
+# chat_id -> время последней отправки (для паузы между сообщениями)
+_last_sent = {}
+
+
+def _retry_delay(attempts: int) -> int:
+    """Экспоненциальная пауза перед повтором, не больше 10 минут"""
+    return min(2 ** attempts * 5, 600)
+
+
+async def _deliver(bot: Bot, message, semaphore, result):
+    async with semaphore:
+        await rate_limiter.acquire()
+        _last_sent[message["chat_id"]] = time.monotonic()
+        try:
+            await bot.send_message(
+                message["chat_id"], message["text"], parse_mode="HTML"
+            )
+        except TelegramRetryAfter as e:
+            rate_limiter.pause(e.retry_after)
+            result["retries"].append((
+                int(time.time()) + e.retry_after, str(e), message["id"]
+            ))
+            return
+        except TelegramForbiddenError as e:
+            result["failed"].append((str(e), message["id"]))
+            result["blocked"].append(message["chat_id"])
+            return
+        except TelegramBadRequest as e:
+            result["failed"].append((str(e), message["id"]))
+            return
+        except Exception as e:
+            attempts = message["attempts"] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                result["failed"].append((str(e), message["id"]))
+            else:
+                result["retries"].append((
+                    int(time.time()) + _retry_delay(attempts), str(e),
+                    message["id"]
+                ))
+            return
+        result["delivered"].append(message["id"])
+
+
+def _paced_chats():
+    """Чаты, которым писали меньше паузы назад; старые отметки чистим"""
+    cutoff = time.monotonic() - OUTBOX_CHAT_INTERVAL_MS / 1000
+    for chat_id in [c for c, t in _last_sent.items() if t < cutoff]:
+        del _last_sent[chat_id]
+    return list(_last_sent)
+
+
+def _pacing_left() -> float:
+    """Сколько ждать, пока освободится первый из выдержанных чатов"""
+    if not _last_sent:
+        return MIN_WAIT
+    release = min(_last_sent.values()) + OUTBOX_CHAT_INTERVAL_MS / 1000
+    return max(release - time.monotonic(), MIN_WAIT)
+
+
+async def _dispatch_once(bot: Bot) -> bool:
+    """Один проход; True — что-то отправили, стоит сразу проверить ещё.
+
+    За проход берётся самое старое готовое сообщение каждого чата,
+    кроме чатов на паузе. Внутри чата сообщения идут по порядку id,
+    но сообщение, отложенное на повтор, может уйти после более
+    поздних сообщений того же чата.
+    """
+    messages = await get_due_outbox(BATCH_SIZE, _paced_chats())
+    if not messages:
+        return False
+
+    result = {
+        "delivered": [], "retries": [], "failed": [], "blocked": [],
+    }
+    semaphore = asyncio.Semaphore(max(1, OUTBOX_WORKERS))
+    await asyncio.gather(*(
+        _deliver(bot, message, semaphore, result) for message in messages
+    ))
+
+    await finish_outbox(
+        result["delivered"], result["retries"], result["failed"]
+    )
+    for chat_id in result["blocked"]:
+        await update_user(chat_id, is_reachable=0)
+    return True
+
+
+async def _dispatcher(bot: Bot):
+    while True:
+        try:
+            sent = await _dispatch_once(bot)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка диспетчера outbox")
+            sent = False
+
+        if sent:
+            continue
+
+        timeout = OUTBOX_POLL_SEC
+        next_time = await get_next_outbox_time()
+        if next_time is not None:
+            timeout = min(timeout, max(next_time - time.time(), 0))
+        if timeout <= 0:
+            # Готовые сообщения есть, но их чаты на паузе
+            timeout = _pacing_left()
+        await wait_outbox(timeout)
+
+
+def start_outbox(bot: Bot):
+    """Запустить фоновую доставку сообщений из outbox"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_dispatcher(bot))
+
+
+async def stop_outbox():
+    """Остановить диспетчер; недоставленное останется в таблице"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -0,0 +1,106 @@
+# payouts.py
+
+# Игра -> эмодзи (для анимированных — эмодзи кубика Telegram)
+GAME_EMOJI = {
+    "dice": "🎲",
+    "slots": "🎰",
+    "darts": "🎯",
+    "football": "⚽",
+    "basketball": "🏀",
+    "bowling": "🎳",
+    "coin": "🪙",
+    "number": "🔢",
+}
+
+# Игры на угадывание: (число равновероятных исходов, множитель).
+# Игрок выигрывает, если угадал один исход из всех.
+CHOICE_GAMES = {
+    "🪙": (2, 2),
+    "🔢": (10, 5),
+}
+
+# Таблицы выплат для игр с анимацией Telegram.
+# Ключ — значение кубика (1–6, у слотов 1–64), значение — множитель
+# ставки; чего нет в таблице — проигрыш. Менять выплаты — только здесь.
+# RTP (средний множитель по шести исходам) не должен превышать 1 —
+# проверять tools/rtp_sim.py.
+PAYOUTS = {
+    "🎲": {4: 2, 5: 2, 6: 2},
+    "🎯": {4: 2, 5: 2, 6: 2},
+    "⚽": {3: 2, 4: 2, 5: 2},
+    "🏀": {4: 2, 5: 2},
+    "🎳": {4: 2, 5: 2, 6: 2},
+}
+
+# Символы барабанов в порядке кодирования Telegram
+SLOT_SYMBOLS = ("bar", "grapes", "lemon", "seven")
+
+# Выплаты слотов по комбинации барабанов
+SLOT_PAYOUTS = {
+    "three_sevens": 10,   # джекпот 7-7-7
+    "three_of_kind": 5,   # три одинаковых
+    "two_sevens": 2,      # две семёрки в любом месте
+}
+
+SLOT_VALUES = 64
+DICE_VALUES = 6
+
+
+def decode_slots(value: int):
+    """Значение слотов (1–64) -> символы трёх барабанов.
+
+    value - 1 — число в системе по основанию 4, левый барабан
+    в младших разрядах.
+    """
+    index = value - 1
+    return tuple(SLOT_SYMBOLS[(index >> shift) & 3] for shift in (0, 2, 4))
+
+
+def _slot_multiplier(reels) -> int:
+    sevens = reels.count("seven")
+    if sevens == 3:
+        return SLOT_PAYOUTS["three_sevens"]
+    if reels[0] == reels[1] == reels[2]:
+        return SLOT_PAYOUTS["three_of_kind"]
+    if sevens == 2:
+        return SLOT_PAYOUTS["two_sevens"]
+    return 0
+
+
+def _compile():
+    """Развернуть таблицы в массивы: индекс — значение кубика"""
+    tables = {}
+    for emoji, payouts in PAYOUTS.items():
+        table = [0] * (DICE_VALUES + 1)
+        for value, multiplier in payouts.items():
+            table[value] = multiplier
+        tables[emoji] = tuple(table)
+
+    tables["🎰"] = (0,) + tuple(
+        _slot_multiplier(decode_slots(value))
+        for value in range(1, SLOT_VALUES + 1)
+    )
+
+    # Угадывание: исход 1 — «угадал», остальные — мимо
+    for emoji, (outcomes, multiplier) in CHOICE_GAMES.items():
+        tables[emoji] = (0, multiplier) + (0,) * (outcomes - 1)
+    return tables
+
+
+_TABLES = _compile()
+
+
+def resolve(emoji: str, value: int) -> int:
+    """Множитель выигрыша для значения кубика (0 — проигрыш)"""
+    return _TABLES[emoji][value]
+
+
+def choice_multiplier(emoji: str) -> int:
+    """Множитель за угаданный исход в игре на угадывание"""
+    return CHOICE_GAMES[emoji][1]
+
+
+def payout_table(emoji: str):
+    """Скомпилированная таблица: индекс — исход (с 1), исходы
+    равновероятны. Нужна симулятору RTP."""
+    return _TABLES[emoji]
@@ -0,0 +1,161 @@
+# scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, NamedTuple
+
+from config import REVEAL_DELAYS, REVEAL_MAX_BATCH, CURRENCY_EMOJI
+from database import settle_game, refund_round, get_pending_rounds
+
+logger = logging.getLogger(__name__)
+
+
+class Round(NamedTuple):
+    """Раунд со списанной ставкой, ждущий показа результата"""
+    round_id: int
+    user_id: int
+    game: str
+    bet: int
+    winnings: int
+    xp: int
+    # reveal(settlement) — показать результат игроку
+    reveal: Callable[..., Awaitable]
+
+
+# Куча (срок, порядковый номер, раунд): ближайший срок сверху
+_heap = []
+_counter = itertools.count()
+_wakeup = None
+_task = None
+
+
+def schedule(emoji: str, round_: Round):
+    """Рассчитать раунд, когда закончится анимация emoji"""
+    deadline = time.monotonic() + REVEAL_DELAYS.get(emoji, 4)
+    heapq.heappush(_heap, (deadline, next(_counter), round_))
+    # Будим цикл, только если новый срок раньше текущего ожидания
+    if _heap[0][2] is round_ and _wakeup is not None:
+        _wakeup.set()
+
+
+async def _settle_batch(rounds):
+    """Рассчитать пачку раундов и показать результаты.
+
+    Все settle_game уходят в очередь записи разом и коммитятся
+    одной пачкой.
+    """
+    settlements = await asyncio.gather(*(
+        settle_game(
+            r.user_id, r.game, r.bet, r.winnings, r.xp,
+            round_id=r.round_id
+        )
+        for r in rounds
+    ), return_exceptions=True)
+
+    reveals = []
+    for round_, settlement in zip(rounds, settlements):
+        if isinstance(settlement, Exception):
+            logger.error(
+                f"Не удалось рассчитать раунд #{round_.round_id}: "
+                f"{settlement!r}"
+            )
+            continue
+        if settlement is not None:
+            reveals.append(round_.reveal(settlement))
+
+    for result in await asyncio.gather(*reveals, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка показа результата игры: {result!r}")
+
+
+def _pop_due(now: float):
+    due = []
+    while _heap and _heap[0][0] <= now and len(due) < REVEAL_MAX_BATCH:
+        due.append(heapq.heappop(_heap)[2])
+    return due
+
+
+async def _loop():
+    while True:
+        if not _heap:
+            timeout = None
+        else:
+            timeout = _heap[0][0] - time.monotonic()
+
+        if timeout is None or timeout > 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        due = _pop_due(time.monotonic())
+        try:
+            await _settle_batch(due)
+        except Exception:
+            logger.exception("Ошибка планировщика раундов")
+
+
+async def _recover():
+    """Рассчитать раунды, оставшиеся с прошлого запуска.
+
+    Сообщение с результатом уже не к чему привязать, поэтому игрок
+    получает короткое уведомление через outbox.
+    """
+    rows = await get_pending_rounds()
+    for row in rows:
+        if row["winnings"] is None:
+            # Исход не успели узнать (анимация не дошла) — возвращаем
+            await refund_round(row["id"], row["user_id"], notify=[(
+                row["user_id"],
+                f"🎮 Игра ({row['game']}) прервана, ставка "
+                f"{row['bet']} {CURRENCY_EMOJI} возвращена"
+            )])
+            continue
+
+        if row["winnings"] > 0:
+            text = (
+                f"🎮 Результат игры ({row['game']}): выигрыш "
+                f"<b>+{row['winnings']}</b> {CURRENCY_EMOJI}"
+            )
+        else:
+            text = (
+                f"🎮 Результат игры ({row['game']}): ставка "
+                f"{row['bet']} {CURRENCY_EMOJI} не сыграла"
+            )
+        await settle_game(
+            row["user_id"], row["game"], row["bet"], row["winnings"],
+            row["xp"], round_id=row["id"],
+            notify=[(row["user_id"], text)]
+        )
+    if rows:
+        logger.info(f"Рассчитано незавершённых раундов: {len(rows)}")
+
+
+async def start_scheduler():
+    global _wakeup, _task
+    if _task is not None:
+        return
+    await _recover()
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_loop())
+
+
+async def stop_scheduler():
+    """Остановить цикл и сразу рассчитать все ожидающие раунды"""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+    while _heap:
+        await _settle_batch(_pop_due(float("inf")))
@@ -0,0 +1,348 @@
+# segments.py
+
+import asyncio
+import logging
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from config import SEGMENTS_REFRESH_MIN, SEGMENTS_PAGE_SIZE
+from database import (
+    add_user_listener, iter_tracked_user_pages, expire_subscriptions
+)
+from levels import RANK_LEVELS
+
+logger = logging.getLogger(__name__)
+
+# Окна активности (дней), для которых держим готовые карты
+ACTIVE_DAYS = (1, 7, 30)
+
+SEGMENTS_HELP = (
+    "<code>все</code> — все, у кого включены уведомления\n"
+    "<code>vip</code>, <code>premium</code> — с активной подпиской\n"
+    f"<code>level>=N</code> — уровень не ниже N "
+    f"(N: {', '.join(map(str, RANK_LEVELS[1:]))})\n"
+    f"<code>active:N</code> — заходили за N дней "
+    f"(N: {', '.join(map(str, ACTIVE_DAYS))})\n"
+    "<code>lang:ru</code> — по языку\n"
+    "<code>newbie</code> — ни разу не играли\n"
+    "Комбинируются через <code>and</code>, <code>or</code>, "
+    "<code>not</code> и скобки"
+)
+
+
+class SegmentError(ValueError):
+    """Ошибка в выражении сегмента"""
+
+
+# ==================== BITMAPS ====================
+
+def _set_bit(bitmap: bytearray, index: int, value: bool):
+    byte = index >> 3
+    if byte >= len(bitmap):
+        bitmap.extend(bytes(byte - len(bitmap) + 1))
+    if value:
+        bitmap[byte] |= 1 << (index & 7)
+    else:
+        bitmap[byte] &= ~(1 << (index & 7)) & 0xFF
+
+
+def _to_int(bitmap: bytearray) -> int:
+    return int.from_bytes(bitmap, "little")
+
+
+class _Segments:
+    """Битовые карты пользователей по признакам.
+
+    Бит i соответствует пользователю с порядковым номером i. Номера
+    раздаются при сборке по возрастанию user_id (ищутся бинарным
+    поиском по array), новым пользователям — по порядку появления.
+    Сборка идёт страницами по возрастанию user_id (add_rows).
+    Карта eligible — кому вообще можно слать рассылку: не забанен,
+    не заблокировал бота и не выключил уведомления.
+    """
+
+    def __init__(self):
+        self.built_at = 0.0
+        self._ids = array("q")
+        self._extra = {}
+        self._size = 0
+        self.eligible = bytearray()
+        self.vip = bytearray()
+        self.premium = bytearray()
+        self.newbie = bytearray()
+        # Уровни — по ступеням рангов: tiers[i] — уровни от
+        # RANK_LEVELS[i] до следующей ступени
+        self.tiers = [bytearray() for _ in RANK_LEVELS]
+        self.active = {days: bytearray() for days in ACTIVE_DAYS}
+        self.languages = {}
+
+    def add_rows(self, rows):
+        """Добавить страницу сборки: user_id больше уже добавленных"""
+        self._ids.extend(row["user_id"] for row in rows)
+        self._size = len(self._ids)
+        for row in rows:
+            self.apply(row)
+
+    def ordinal(self, user_id: int, create: bool = False):
+        index = bisect_left(self._ids, user_id)
+        if index < len(self._ids) and self._ids[index] == user_id:
+            return index
+        index = self._extra.get(user_id)
+        if index is None and create:
+            index = self._extra[user_id] = self._size
+            self._size += 1
+        return index
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def apply(self, row):
+        """Обновить биты пользователя по новым значениям строки"""
+        index = self.ordinal(row["user_id"], create=True)
+        now = time.time()
+
+        _set_bit(self.eligible, index, bool(
+            not row["is_banned"] and row["is_reachable"]
+            and row["notifications"]
+        ))
+        _set_bit(self.vip, index, bool(
+            row["is_vip"] and row["vip_until"] > now
+        ))
+        _set_bit(self.premium, index, bool(
+            row["is_premium"] and row["premium_until"] > now
+        ))
+        _set_bit(self.newbie, index, row["games_played"] == 0)
+
+        tier = max(bisect_right(RANK_LEVELS, row["level"]) - 1, 0)
+        for i, bitmap in enumerate(self.tiers):
+            _set_bit(bitmap, index, i == tier)
+
+        last_seen = max(row["last_game"], row["last_daily"])
+        for days, bitmap in self.active.items():
+            _set_bit(bitmap, index, last_seen >= now - days * 86400)
+
+        language = row["language"] or ""
+        if language not in self.languages:
+            self.languages[language] = bytearray()
+        for name, bitmap in self.languages.items():
+            _set_bit(bitmap, index, name == language)
+
+
+_segments = _Segments()
+_pending = None
+_task = None
+
+
+# ==================== EXPRESSIONS ====================
+
+_TOKEN = re.compile(r"\s*(\(|\)|&|\||!|[^\s()&|!]+)")
+_OPERATORS = {
+    "and": "&", "и": "&", "&": "&",
+    "or": "|", "или": "|", "|": "|",
+    "not": "!", "не": "!", "!": "!",
+}
+
+
+def _tokenize(expr: str):
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = _TOKEN.match(expr, pos)
+        if not match:
+            raise SegmentError(f"Не разобрать: {expr[pos:]}")
+        token = match.group(1)
+        tokens.append(_OPERATORS.get(token.lower(), token))
+        pos = match.end()
+    return tokens
+
+
+def _atom(name: str):
+    """Функция segments -> int для одного признака"""
+    name = name.lower()
+    if name in ("все", "all"):
+        return lambda s: (1 << s.size) - 1
+    if name in ("vip", "premium", "newbie"):
+        return lambda s: _to_int(getattr(s, name))
+
+    match = re.fullmatch(r"level>=(\d+)", name)
+    if match:
+        level = int(match.group(1))
+        if level not in RANK_LEVELS:
+            raise SegmentError(
+                f"level>= поддерживает только: "
+                f"{', '.join(map(str, RANK_LEVELS))}"
+            )
+        first = RANK_LEVELS.index(level)
+
+        def levels(s):
+            result = 0
+            for bitmap in s.tiers[first:]:
+                result |= _to_int(bitmap)
+            return result
+        return levels
+
+    match = re.fullmatch(r"active(?::(\d+))?", name)
+    if match:
+        days = int(match.group(1) or 7)
+        if days not in ACTIVE_DAYS:
+            raise SegmentError(
+                f"active: поддерживает только "
+                f"{', '.join(map(str, ACTIVE_DAYS))} дней"
+            )
+        return lambda s: _to_int(s.active[days])
+
+    match = re.fullmatch(r"lang:(\w+)", name)
+    if match:
+        language = match.group(1)
+        return lambda s: _to_int(s.languages.get(language, b""))
+
+    raise SegmentError(f"Неизвестный сегмент: {name}")
+
+
+def compile_segment(expr: str):
+    """Разобрать выражение в функцию segments -> int.
+
+    Приоритет: not, затем and, затем or.
+    """
+    tokens = _tokenize(expr)
+    if not tokens:
+        return _atom("все")
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        left = parse_and()
+        while peek() == "|":
+            take()
+            left = (lambda a, b: lambda s: a(s) | b(s))(left, parse_and())
+        return left
+
+    def parse_and():
+        left = parse_not()
+        while peek() == "&":
+            take()
+            left = (lambda a, b: lambda s: a(s) & b(s))(left, parse_not())
+        return left
+
+    def parse_not():
+        token = peek()
+        if token == "!":
+            take()
+            inner = parse_not()
+            return lambda s: ((1 << s.size) - 1) & ~inner(s)
+        if token == "(":
+            take()
+            inner = parse_or()
+            if peek() != ")":
+                raise SegmentError("Не закрыта скобка")
+            take()
+            return inner
+        if token is None or token in ("&", "|", ")"):
+            raise SegmentError("Ожидался сегмент")
+        return _atom(take())
+
+    result = parse_or()
+    if pos != len(tokens):
+        raise SegmentError(f"Лишнее в выражении: {' '.join(tokens[pos:])}")
+    return result
+
+
+def audience(expr: str) -> bytes:
+    """Битовая карта получателей: выражение AND eligible"""
+    bits = compile_segment(expr)(_segments) & _to_int(_segments.eligible)
+    return bits.to_bytes((_segments.size + 7) // 8, "little")
+
+
+def count(expr: str) -> int:
+    """Размер аудитории сегмента"""
+    bits = compile_segment(expr)(_segments) & _to_int(_segments.eligible)
+    return bits.bit_count()
+
+
+def contains(bitmap: bytes, user_id: int) -> bool:
+    """Есть ли пользователь в карте, полученной из audience()"""
+    index = _segments.ordinal(user_id)
+    if index is None or index >> 3 >= len(bitmap):
+        return False
+    return bool(bitmap[index >> 3] >> (index & 7) & 1)
+
+
+# ==================== REFRESH ====================
+
+def _on_user_change(row):
+    if _pending is not None:
+        # Идёт пересборка — применим после подмены карт
+        _pending.append(row)
+    _segments.apply(row)
+
+
+async def refresh_segments(on_page=None):
+    """Пересобрать карты целиком из базы.
+
+    Пользователи читаются страницами, и после каждой страницы бот
+    успевает обработать апдейты. До подмены работают старые карты;
+    изменения за время сборки применяются к новым в конце.
+    on_page(rows) получает те же страницы — при старте так заодно
+    загружаются рейтинги.
+    """
+    global _segments, _pending
+    _pending = []
+    try:
+        segments = _Segments()
+        async for rows in iter_tracked_user_pages(SEGMENTS_PAGE_SIZE):
+            segments.add_rows(rows)
+            if on_page is not None:
+                on_page(rows)
+            await asyncio.sleep(0)
+        for row in _pending:
+            segments.apply(row)
+        segments.built_at = time.time()
+        _segments = segments
+    finally:
+        _pending = None
+
+
+async def _refresh_loop():
+    while True:
+        await asyncio.sleep(SEGMENTS_REFRESH_MIN * 60)
+        try:
+            # Заодно снимаем истёкшие VIP/Premium (флаги и счётчики)
+            await expire_subscriptions()
+            await refresh_segments()
+        except Exception:
+            logger.exception("Ошибка пересборки сегментов")
+
+
+async def init_segments(on_page=None):
+    """Построить карты при старте и запустить периодическую пересборку.
+
+    on_page — см. refresh_segments.
+    """
+    global _task
+    add_user_listener(_on_user_change)
+    await refresh_segments(on_page)
+    if _task is None and SEGMENTS_REFRESH_MIN > 0:
+        _task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_segments():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
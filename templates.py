@@ -0,0 +1,90 @@
+# templates.py
+#
+# Тексты статичных и почти статичных экранов — строковые константы,
+# собранные один раз при импорте. В экраны с изменяемыми значениями
+# (баланс, число пользователей) они подставляются при показе.
+
+from config import SHOP_ITEMS, CURRENCY_EMOJI, BOT_NAME, BOT_VERSION
+
+
+# ==================== SCREENS ====================
+
+GAMES_MENU = (
+    "🎮 <b>Мини-игры</b>\n\n"
+    "Выбери игру и делай ставку!\n\n"
+    "🎲 <b>Кости</b> — Кинь кости, 4+ побеждает\n"
+    "🪙 <b>Монетка</b> — Угадай сторону\n"
+    "🎰 <b>Слоты</b> — Крути барабаны\n"
+    "🔢 <b>Угадай число</b> — Угадай от 1 до 10\n"
+    "🎯 <b>Дартс</b> — Попади в цель\n"
+    "⚽ <b>Футбол</b> — Забей гол\n"
+    "🏀 <b>Баскетбол</b> — Забрось мяч\n"
+    "🎳 <b>Боулинг</b> — Сбей кегли\n"
+)
+
+FAQ = (
+    "❓ <b>FAQ — Частые вопросы</b>\n\n"
+    "<b>Q: Как заработать монеты?</b>\n"
+    "A: Играйте в мини-игры, получайте ежедневные "
+    "бонусы, приглашайте друзей!\n\n"
+    "<b>Q: Как активировать промокод?</b>\n"
+    "A: Нажмите «🎁 Промокод» → «🔑 Ввести промокод»\n\n"
+    "<b>Q: Как пригласить друга?</b>\n"
+    "A: Перейдите в раздел «👥 Рефералы» "
+    "и поделитесь ссылкой\n\n"
+    "<b>Q: Что даёт VIP/Premium?</b>\n"
+    "A: Увеличенные ежедневные бонусы "
+    "и особый статус в профиле\n\n"
+    "<b>Q: Как работают уровни?</b>\n"
+    "A: Выполняйте действия (игры, покупки, бонусы) "
+    "чтобы получать XP и повышать уровень"
+)
+
+PROMO_INTRO = (
+    "🎁 <b>Промокоды</b>\n\n"
+    "Введите промокод, чтобы получить награду!\n\n"
+    "💡 Промокоды можно найти:\n"
+    "• В нашем канале\n"
+    "• В розыгрышах\n"
+    "• У партнёров\n"
+)
+
+# Экран «О боте»: ABOUT_HEAD + число пользователей + ABOUT_TAIL
+ABOUT_HEAD = (
+    f"ℹ️ <b>О боте</b>\n\n"
+    f"🤖 {BOT_NAME}\n"
+    f"📌 Версия: {BOT_VERSION}\n"
+    "👥 Пользователей: "
+)
+ABOUT_TAIL = (
+    "\n\n"
+    "<b>Возможности:</b>\n"
+    "• 🎮 8 мини-игр\n"
+    "• 🛒 Магазин предметов\n"
+    "• 🎁 Промокоды\n"
+    "• 📅 Ежедневные бонусы\n"
+    "• 👥 Реферальная система\n"
+    "• 🏆 Рейтинги игроков\n"
+    "• 💬 Система поддержки\n"
+    "• ⚙️ Настройки\n\n"
+    "Разработано с ❤️"
+)
+
+
+def _shop_catalogue() -> str:
+    return "".join(
+        f"{item['emoji']} <b>{item['name']}</b>\n"
+        f"   📝 {item['description']}\n"
+        f"   💵 Цена: {item['price']} {CURRENCY_EMOJI}\n\n"
+        for item in SHOP_ITEMS.values()
+    )
+
+
+# Каталог SHOP_ITEMS задаётся в конфиге и во время работы не меняется,
+# поэтому собирается один раз. Экран: SHOP_HEAD + баланс + SHOP_TAIL
+SHOP_HEAD = "🛒 <b>Магазин</b>\n\n💰 Ваш баланс: <b>"
+SHOP_TAIL = (
+    f"</b> {CURRENCY_EMOJI}\n\n"
+    "Выберите товар для покупки:\n\n"
+    + _shop_catalogue()
+)
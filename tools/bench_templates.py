@@ -0,0 +1,159 @@
+# tools/bench_templates.py
+"""Микробенчмарк: сборка текста экранов f-строками и из констант.
+
+Для экранов с изменяемыми значениями (О боте, магазин) сравнивает прежнюю сборку
+текста в хендлере (f-строки и цикл по SHOP_ITEMS) с templates.py и
+показывает время одного показа в микросекундах. Для статичных
+экранов только проверяет, что константы совпадают с прежним текстом.
+
+Запуск:
+    python tools/bench_templates.py --number 200000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SHOP_ITEMS, CURRENCY_EMOJI, BOT_NAME, BOT_VERSION  # noqa: E402
+from templates import (  # noqa: E402
+    GAMES_MENU, FAQ, PROMO_INTRO, ABOUT_HEAD, ABOUT_TAIL, SHOP_HEAD,
+    SHOP_TAIL
+)
+
+BALANCE = 12345
+USERS_COUNT = 67890
+
+
+# ==================== LEGACY ====================
+# Тексты в том виде, как их собирали хендлеры до templates.py
+
+def legacy_games():
+    return (
+        f"🎮 <b>Мини-игры</b>\n\n"
+        f"Выбери игру и делай ставку!\n\n"
+        f"🎲 <b>Кости</b> — Кинь кости, 4+ побеждает\n"
+        f"🪙 <b>Монетка</b> — Угадай сторону\n"
+        f"🎰 <b>Слоты</b> — Крути барабаны\n"
+        f"🔢 <b>Угадай число</b> — Угадай от 1 до 10\n"
+        f"🎯 <b>Дартс</b> — Попади в цель\n"
+        f"⚽ <b>Футбол</b> — Забей гол\n"
+        f"🏀 <b>Баскетбол</b> — Забрось мяч\n"
+        f"🎳 <b>Боулинг</b> — Сбей кегли\n"
+    )
+
+
+def legacy_faq():
+    return (
+        f"❓ <b>FAQ — Частые вопросы</b>\n\n"
+        f"<b>Q: Как заработать монеты?</b>\n"
+        f"A: Играйте в мини-игры, получайте ежедневные "
+        f"бонусы, приглашайте друзей!\n\n"
+        f"<b>Q: Как активировать промокод?</b>\n"
+        f"A: Нажмите «🎁 Промокод» → «🔑 Ввести промокод»\n\n"
+        f"<b>Q: Как пригласить друга?</b>\n"
+        f"A: Перейдите в раздел «👥 Рефералы» "
+        f"и поделитесь ссылкой\n\n"
+        f"<b>Q: Что даёт VIP/Premium?</b>\n"
+        f"A: Увеличенные ежедневные бонусы "
+        f"и особый статус в профиле\n\n"
+        f"<b>Q: Как работают уровни?</b>\n"
+        f"A: Выполняйте действия (игры, покупки, бонусы) "
+        f"чтобы получать XP и повышать уровень"
+    )
+
+
+def legacy_promo():
+    return (
+        f"🎁 <b>Промокоды</b>\n\n"
+        f"Введите промокод, чтобы получить награду!\n\n"
+        f"💡 Промокоды можно найти:\n"
+        f"• В нашем канале\n"
+        f"• В розыгрышах\n"
+        f"• У партнёров\n"
+    )
+
+
+def legacy_about(users_count):
+    return (
+        f"ℹ️ <b>О боте</b>\n\n"
+        f"🤖 {BOT_NAME}\n"
+        f"📌 Версия: {BOT_VERSION}\n"
+        f"👥 Пользователей: {users_count}\n\n"
+        f"<b>Возможности:</b>\n"
+        f"• 🎮 8 мини-игр\n"
+        f"• 🛒 Магазин предметов\n"
+        f"• 🎁 Промокоды\n"
+        f"• 📅 Ежедневные бонусы\n"
+        f"• 👥 Реферальная система\n"
+        f"• 🏆 Рейтинги игроков\n"
+        f"• 💬 Система поддержки\n"
+        f"• ⚙️ Настройки\n\n"
+        f"Разработано с ❤️"
+    )
+
+
+def legacy_shop(balance):
+    text = (
+        f"🛒 <b>Магазин</b>\n\n"
+        f"💰 Ваш баланс: <b>{balance}</b> {CURRENCY_EMOJI}\n\n"
+        f"Выберите товар для покупки:\n\n"
+    )
+    for item_id, item in SHOP_ITEMS.items():
+        text += (
+            f"{item['emoji']} <b>{item['name']}</b>\n"
+            f"   📝 {item['description']}\n"
+            f"   💵 Цена: {item['price']} {CURRENCY_EMOJI}\n\n"
+        )
+    return text
+
+
+# Статичные экраны: (экран, прежняя сборка, константа)
+STATIC_SCREENS = (
+    ("games", legacy_games, GAMES_MENU),
+    ("faq", legacy_faq, FAQ),
+    ("promo", legacy_promo, PROMO_INTRO),
+)
+
+# (экран, прежняя сборка, сборка из констант) — как в хендлерах
+SCREENS = (
+    ("about", lambda: legacy_about(USERS_COUNT),
+     lambda: f"{ABOUT_HEAD}{USERS_COUNT}{ABOUT_TAIL}"),
+    ("shop", lambda: legacy_shop(BALANCE),
+     lambda: SHOP_HEAD + str(BALANCE) + SHOP_TAIL),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100_000,
+                        help="показов на замер")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="замеров, берётся лучший")
+    args = parser.parse_args()
+
+    for name, legacy, text in STATIC_SCREENS:
+        if legacy() != text:
+            sys.exit(f"{name}: константа отличается от прежнего текста")
+
+    print(f"{'экран':<8}{'f-строки':>12}{'константы':>12}{'ускорение':>12}")
+    for name, legacy, template in SCREENS:
+        if legacy() != template():
+            sys.exit(f"{name}: текст отличается от прежнего")
+
+        timings = []
+        for render in (legacy, template):
+            best = min(timeit.repeat(
+                render, number=args.number, repeat=args.repeat
+            ))
+            timings.append(best / args.number * 1e6)
+        print(
+            f"{name:<8}{timings[0]:>10.3f}мкс{timings[1]:>9.3f}мкс"
+            f"{timings[0] / timings[1]:>11.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
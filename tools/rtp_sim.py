@@ -0,0 +1,154 @@
+# tools/rtp_sim.py
+"""Монте-Карло симулятор RTP и риска разорения для игр бота.
+
+Берёт те же таблицы выплат, что и бот (payouts.py), и для каждой
+игры считает:
+- RTP — средний возврат на единицу ставки;
+- дисперсию и стандартное отклонение выигрыша на единицу ставки;
+- кривую разорения: доля игроков со стартовым балансом, которые
+  к раунду N уже не могут сделать ставку;
+- эмиссию/сжигание монет на 1000 раундов при реальном
+  распределении ставок (из базы или равномерно по GAME_BETS).
+
+Запуск (нужен numpy из requirements-dev.txt):
+    python tools/rtp_sim.py --rounds 2000000 --seed 42
+    python tools/rtp_sim.py --db bot_database.db
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GAME_BETS, START_BALANCE  # noqa: E402
+from payouts import GAME_EMOJI, payout_table  # noqa: E402
+
+# Контрольные точки кривой разорения (раунды)
+RUIN_CHECKPOINTS = (10, 50, 100, 250, 500, 1000)
+
+
+def bet_distribution(db_path: str = None):
+    """(ставки, вероятности): из журнала транзакций или равномерно"""
+    if db_path:
+        uri = f"file:{db_path}?mode=ro"
+        with sqlite3.connect(uri, uri=True) as db:
+            rows = db.execute(
+                """SELECT -amount, COUNT(*) FROM transactions
+                WHERE description LIKE 'Ставка:%' AND amount < 0
+                GROUP BY amount"""
+            ).fetchall()
+        if rows:
+            bets = np.array([bet for bet, _ in rows], dtype=np.int64)
+            counts = np.array([n for _, n in rows], dtype=np.float64)
+            return bets, counts / counts.sum(), "из базы"
+
+    bets = np.array(GAME_BETS, dtype=np.int64)
+    return bets, np.full(len(bets), 1 / len(bets)), "равномерно"
+
+
+def sample_multipliers(rng, table, size):
+    """Множители для size раундов: исходы равновероятны (с 1)"""
+    table = np.asarray(table, dtype=np.int64)
+    values = rng.integers(1, len(table), size=size)
+    return table[values]
+
+
+def simulate_game(rng, emoji, rounds, bets, weights):
+    table = payout_table(emoji)
+    multipliers = sample_multipliers(rng, table, rounds)
+    # Чистый результат на единицу ставки: -1 проигрыш, m-1 выигрыш
+    net = multipliers - 1
+
+    stakes = rng.choice(bets, size=rounds, p=weights)
+    minted = (stakes * net).sum()
+
+    exact = np.mean(np.asarray(table[1:], dtype=np.float64))
+    return {
+        "rtp": multipliers.mean(),
+        "rtp_exact": exact,
+        "variance": net.var(),
+        "hit_rate": (multipliers > 0).mean(),
+        "max_multiplier": max(table),
+        "mint_per_1000": minted / rounds * 1000,
+        "mean_stake": stakes.mean(),
+    }
+
+
+def ruin_curve(rng, emoji, players, bet, bankroll):
+    """Доля разорившихся к каждой контрольной точке.
+
+    Игрок ставит bet каждый раунд, пока баланс позволяет. Разорение —
+    первый момент, когда баланс меньше ставки; дальше путь не важен,
+    поэтому хватает бегущего минимума по кумулятивной сумме.
+    """
+    horizon = RUIN_CHECKPOINTS[-1]
+    table = payout_table(emoji)
+    net = (sample_multipliers(rng, table, (players, horizon)) - 1) * bet
+    balance = bankroll + np.cumsum(net, axis=1, dtype=np.int64)
+    ruined_at = np.minimum.accumulate(balance, axis=1) < bet
+    return [ruined_at[:, t - 1].mean() for t in RUIN_CHECKPOINTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1_000_000,
+                        help="раундов на игру")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--players", type=int, default=10_000,
+                        help="игроков для кривой разорения")
+    parser.add_argument("--bet", type=int, default=GAME_BETS[0],
+                        help="ставка для кривой разорения")
+    parser.add_argument("--bankroll", type=int, default=START_BALANCE,
+                        help="стартовый баланс для кривой разорения")
+    parser.add_argument("--db", help="база бота для распределения ставок")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+    bets, weights, source = bet_distribution(args.db)
+
+    print(
+        f"Раундов на игру: {args.rounds:,}, seed={args.seed}, "
+        f"ставки ({source}): "
+        + ", ".join(f"{b}:{w:.0%}" for b, w in zip(bets, weights))
+    )
+    print()
+    print(
+        f"{'игра':<11}{'RTP':>8}{'точно':>8}{'σ²':>8}{'попад.':>8}"
+        f"{'макс':>6}{'монет/1000 р.':>16}"
+    )
+
+    total_mint = 0.0
+    for game, emoji in GAME_EMOJI.items():
+        stats = simulate_game(rng, emoji, args.rounds, bets, weights)
+        total_mint += stats["mint_per_1000"]
+        print(
+            f"{game:<11}{stats['rtp']:>8.4f}{stats['rtp_exact']:>8.4f}"
+            f"{stats['variance']:>8.3f}{stats['hit_rate']:>8.1%}"
+            f"{'x' + str(stats['max_multiplier']):>6}"
+            f"{stats['mint_per_1000']:>+16,.0f}"
+        )
+    print(
+        f"\nВ среднем по играм: {total_mint / len(GAME_EMOJI):+,.0f} "
+        f"монет на 1000 раундов (плюс — эмиссия, минус — сжигание)"
+    )
+
+    print(
+        f"\nРазорение: баланс {args.bankroll}, ставка {args.bet}, "
+        f"{args.players:,} игроков"
+    )
+    print(f"{'игра':<11}" + "".join(f"{t:>8}" for t in RUIN_CHECKPOINTS))
+    for game, emoji in GAME_EMOJI.items():
+        curve = ruin_curve(rng, emoji, args.players, args.bet, args.bankroll)
+        print(f"{game:<11}" + "".join(f"{p:>8.1%}" for p in curve))
+
+    print(f"\nГотово за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()